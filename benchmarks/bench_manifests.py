@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+parse time of 1000 package.yml with the different yaml backends
+and with the json copy of the manifests
+
+usage: python benchmarks/bench_manifests.py [count]
+"""
+
+import os
+import sys
+import time
+import yaml
+import shutil
+import tempfile
+
+vpm_module = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, vpm_module)
+
+import vpm
+
+MANIFEST = """name: "ip_%d"
+version: "1.%d.0"
+description: "synthetic package for benchmarking"
+designs:
+%s
+models:
+  - ./model/ip_%d.sv
+constraints:
+  - ./constraints/ip_%d.sdc
+dependencies:
+  - resync >= 0.0.1
+  - ip_%d = 1.0.0
+"""
+
+
+def make_manifests(root: str, count: int):
+    paths = []
+    for i in range(count):
+        path = os.path.join(root, "ip_%d" % i)
+        os.makedirs(path)
+        designs = "\n".join(["  - ./design/file_%d.v" % j for j in range(20)])
+        with open(os.path.join(path, "package.yml"), "w+") as fp:
+            fp.write(MANIFEST % (i, i, designs, i, i, max(i - 1, 0)))
+        # not racy
+        os.utime(os.path.join(path, "package.yml"), (0, 0))
+        paths.append(path)
+    return paths
+
+
+def bench(name: str, count: int, func, paths):
+    start = time.perf_counter()
+    for path in paths:
+        func(path)
+    elapsed = time.perf_counter() - start
+    print("%-32s %8.1f ms / 1000 manifests" % (name, elapsed * 1000.0 * 1000 / count))
+
+
+def yaml_with(loader):
+    def load(path):
+        with open(os.path.join(path, "package.yml"), "r") as fp:
+            return yaml.load(fp, Loader=loader)
+    return load
+
+
+def read_cold(path):
+    vpm.clear_package_cache()
+    return vpm.read_package(path)
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    root = tempfile.mkdtemp()
+    os.environ["VPM_CACHE_DIR"] = os.path.join(root, "cache")
+    try:
+        paths = make_manifests(os.path.join(root, "ips"), count)
+        print("libyaml available: %s" % yaml.__with_libyaml__)
+        bench("yaml.FullLoader", count, yaml_with(yaml.FullLoader), paths)
+        bench("yaml.SafeLoader", count, yaml_with(yaml.SafeLoader), paths)
+        if yaml.__with_libyaml__:
+            bench("yaml.CSafeLoader", count, yaml_with(yaml.CSafeLoader), paths)
+        bench("read_package (no cache)", count, read_cold, paths)
+        for path in paths:
+            vpm.read_package(path)
+        bench("read_package (in process)", count, vpm.read_package, paths)
+        # enable the json copy of manifests
+        with open(os.path.join(root, "vpm.config"), "w+") as fp:
+            fp.write("[cache]\nmanifests=yes\n")
+        os.chdir(root)
+        bench("read_package (json, first)", count, read_cold, paths)
+        bench("read_package (json)", count, read_cold, paths)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+resolution time of synthetic dependency graphs
+
+each package has 3 versions and depends on a few packages
+of a lower rank with >=, >, =, <, <= or no constraint.
+the last tenth of the packages is requested and the number of visits
+of the former depth-first install (one install_package per dependency)
+is given for comparison
+
+usage: python benchmarks/bench_resolver.py [count ...]
+"""
+
+import os
+import sys
+import time
+import random
+
+vpm_module = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, vpm_module)
+
+import vpm
+
+VERSIONS = ["1.0.1", "1.0.2", "1.0.3"]
+CONSTRAINTS = ["", " >= 1.0.1", " > 1.0.1", " = 1.0.2", " < 1.0.3", " <= 1.0.2"]
+
+
+def make_graph(count: int, seed: int = 0):
+    # name -> [(package, source)] the newest first
+    rnd = random.Random(seed)
+    graph = {}
+    for i in range(count):
+        name = "ip_%d" % i
+        candidates = []
+        for version in reversed(VERSIONS):
+            pkg = vpm.Package(name, version)
+            deps = rnd.sample(range(i), min(i, rnd.randint(1, 4))) if i else []
+            pkg.dependencies = [
+                vpm.Package.parse_package_name("ip_%d%s" % (d, rnd.choice(CONSTRAINTS)))
+                for d in deps
+            ]
+            candidates.append((pkg, "%s/%s" % (name, version)))
+        graph[name] = candidates
+    return graph
+
+
+def depth_first_visits(graph: dict, names: list, limit: int = 10 ** 7):
+    # number of install_package calls of the former recursion
+    visits, stack = 0, list(names)
+    while stack and visits < limit:
+        pkg, _ = graph[stack.pop()][0]
+        visits += 1
+        stack.extend(dep.name for dep in pkg.dependencies)
+    return visits
+
+
+if __name__ == "__main__":
+    counts = [int(c) for c in sys.argv[1:]] or [1000, 5000, 10000]
+    for count in counts:
+        graph = make_graph(count)
+        # the last tenth of the packages is requested
+        roots = ["ip_%d" % i for i in range(count - count // 10, count)]
+        start = time.perf_counter()
+        reqs = [vpm.Package(r) for r in roots]
+        plan = vpm.resolve(reqs, lambda name: graph.get(name, []))
+        elapsed = time.perf_counter() - start
+        visits = depth_first_visits(graph, roots)
+        print("%6d packages: %5d resolved in %8.1f ms, depth-first visits %s%d" % (
+            count, len(plan), elapsed * 1000.0,
+            ">=" if visits >= 10 ** 7 else "", visits
+        ))
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+parse and sort time of 100k versions
+
+usage: python benchmarks/bench_versions.py [count]
+"""
+
+import os
+import sys
+import time
+import random
+
+vpm_module = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, vpm_module)
+
+import vpm
+
+
+def make_versions(count: int, seed: int = 0):
+    rnd = random.Random(seed)
+    suffixes = [""] * 8 + ["-rc1", "-rc2", "-alpha"]
+    return ["%d.%d.%d%s" % (rnd.randint(0, 20), rnd.randint(0, 50), rnd.randint(0, 100),
+                            rnd.choice(suffixes)) for _ in range(count)]
+
+
+def bench(name: str, func):
+    start = time.perf_counter()
+    result = func()
+    print("%-32s %8.1f ms" % (name, (time.perf_counter() - start) * 1000.0))
+    return result
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    values = make_versions(count)
+    print("%d versions, %d distinct" % (count, len(set(values))))
+    versions = bench("parse", lambda: [vpm.Version(v) for v in values])
+    bench("parse (cached)", lambda: [vpm.Version(v) for v in values])
+    bench("sort", lambda: sorted(versions))
+    bench("sort by key", lambda: sorted(versions, key=lambda v: v.key))
+    bench("deduplicate", lambda: set(versions))
+    bench("max", lambda: max(versions))
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+stand-in of the github api serving a local directory as a repository
+"""
+
+import os
+import json
+import time
+import base64
+import hashlib
+import threading
+
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+
+def blob_sha(content: bytes):
+    header = ("blob %d\0" % len(content)).encode("utf-8")
+    return hashlib.sha1(header + content).hexdigest()
+
+
+class FakeGithubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status: int, body: bytes = b"", headers: dict = {}):
+        self.server.statuses.append(status)
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            limited = server.rate_limited > 0
+            server.rate_limited -= 1 if limited else 0
+        if limited:
+            return self.send(403, b'{"message": "API rate limit exceeded"}', {
+                "X-RateLimit-Remaining": "0",
+                "X-RateLimit-Reset": "%d" % (time.time() + 1)
+            })
+        path = self.path.split("?")[0]
+        prefix = "/repos/%s/git/" % server.repository
+        if path == prefix + "trees/%s" % server.branch:
+            tree = server.tree()
+            etag = '"%s"' % tree["sha"]
+            if self.headers.get("If-None-Match") == etag:
+                return self.send(304, b"", {"ETag": etag})
+            body = json.dumps(tree).encode("utf-8")
+            return self.send(200, body, {
+                "Content-Type": "application/json; charset=utf-8",
+                "ETag": etag
+            })
+        if path.startswith(prefix + "blobs/"):
+            content = server.blobs().get(path.split("/")[-1])
+            if content is None:
+                return self.send(404, b'{"message": "Not Found"}')
+            if server.corrupted:
+                content += b"\x00"
+            if "raw" in self.headers.get("Accept", ""):
+                return self.send(200, content, {"Content-Type": "application/octet-stream"})
+            body = json.dumps({
+                "encoding": "base64",
+                "content": base64.b64encode(content).decode("utf-8")
+            }).encode("utf-8")
+            return self.send(200, body, {"Content-Type": "application/json; charset=utf-8"})
+        return self.send(404, b'{"message": "Not Found"}')
+
+
+class FakeGithub(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, root: str, repository: str = "user/repo", branch: str = "master"):
+        super().__init__(("127.0.0.1", 0), FakeGithubHandler)
+        self.root = root
+        self.repository = repository
+        self.branch = branch
+        self.lock = threading.Lock()
+        self.requests = []
+        self.statuses = []
+        self.connections = 0
+        self.rate_limited = 0
+        self.corrupted = False
+        self.thread = threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True)
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%d" % self.server_address[1]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+    def files(self):
+        for base, dirs, files in os.walk(self.root):
+            for file in sorted(files):
+                filepath = os.path.join(base, file)
+                with open(filepath, "rb") as fp:
+                    rel = os.path.relpath(filepath, self.root)
+                    yield rel.replace(os.sep, "/"), fp.read()
+
+    def blobs(self):
+        return {blob_sha(content): content for path, content in self.files()}
+
+    def tree(self):
+        tree = []
+        for path, content in self.files():
+            sha = blob_sha(content)
+            tree.append({
+                "path": path,
+                "mode": "100644",
+                "type": "blob",
+                "sha": sha,
+                "size": len(content),
+                "url": "%s/repos/%s/git/blobs/%s" % (self.url, self.repository, sha)
+            })
+        sha = hashlib.sha1(json.dumps(tree).encode("utf-8")).hexdigest()
+        return {"sha": sha, "tree": tree, "truncated": False}
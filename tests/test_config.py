@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import os
+import sys
+import unittest
+
+vpm_module = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(vpm_module)
+
+import vpm
+
+
+class ConfigTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tests_dir = os.path.dirname(os.path.abspath(__file__))
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        sys.stdout, sys.stderr = None, None
+        os.environ.pop("VPM_CONFIG", None)
+
+    def tearDown(self):
+        sys.stdout = sys.__stdout__
+        sys.stderr = sys.__stderr__
+        os.environ.pop("VPM_CONFIG", None)
+        os.environ.pop("VPM_CEILING_DIRECTORIES", None)
+        os.chdir(self.cwd)
+
+    def test_upward(self):
+        # from a sub-directory find the config of the platform
+        os.chdir("%s/platform/design/adc_sar" % self.tests_dir)
+        path = vpm.find_config_path()
+        assert path == os.path.join(self.tests_dir, "platform", "vpm.config")
+        vpm.find_config()
+        assert os.environ["PLATFORM"] == os.path.join(self.tests_dir, "platform")
+        # never look into sub-directories
+        os.chdir(self.tests_dir)
+        assert vpm.find_config_path() is None
+        # stop at the ceiling
+        os.chdir("%s/platform/design/adc_sar" % self.tests_dir)
+        ceiling = os.path.join(self.tests_dir, "platform", "design")
+        os.environ["VPM_CEILING_DIRECTORIES"] = ceiling
+        assert vpm.find_config_path() is None
+
+    def test_override(self):
+        os.chdir("%s/platform" % self.tests_dir)
+        os.environ["VPM_CONFIG"] = os.path.join(self.tests_dir, "sar")
+        assert vpm.find_config_path() == os.path.join(self.tests_dir, "sar", "vpm.config")
+        assert len(list(vpm.list_sources(no_print=True))) == 2
+        os.environ["VPM_CONFIG"] = os.path.join(self.tests_dir, "resync", "vpm.config")
+        assert vpm.find_config() is None
+
+    def test_cache(self):
+        os.chdir("%s/platform" % self.tests_dir)
+        cfg = vpm.find_config()
+        assert vpm.find_config() is cfg
+        vpm.clear_config_cache()
+        assert vpm.find_config() is not cfg
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import os
+import sys
+import types
+import shutil
+import tempfile
+import unittest
+
+vpm_module = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(vpm_module)
+
+import vpm
+
+
+class DiffTests(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def write(self, name: str, content):
+        path = os.path.join(self.dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb" if isinstance(content, bytes) else "w") as fp:
+            fp.write(content)
+        return path
+
+    def test_identical(self):
+        lines = "".join("assign w%d = a%d;\n" % (i, i) for i in range(10000))
+        a, b = self.write("a.v", lines), self.write("b.v", lines)
+        assert vpm.same_content(a, b)
+        assert list(vpm.Package.iter_diff(a, b)) == []
+        c = self.write("c.v", lines.replace("w9999", "x9999"))
+        assert not vpm.same_content(a, c)
+
+    def test_hunks(self):
+        lines = ["assign w%d = a%d;\n" % (i, i) for i in range(100)]
+        a = self.write("a.v", "".join(lines))
+        lines[10] = "assign w10 = b10;\n"
+        lines[80] = "assign w80 = b80;\n"
+        b = self.write("b.v", "".join(lines))
+        hunks = list(vpm.Package.iter_diff(a, b))
+        assert len(hunks) == 2
+        assert hunks[0].startswith("--- %s\n+++ %s\n@@" % (a, b))
+        assert "+assign w80 = b80;\n" in hunks[1]
+        # truncated
+        hunks = list(vpm.Package.iter_diff(a, b, max_output=200))
+        assert len(hunks) == 1
+        assert hunks[0].endswith("... diff truncated after 200 bytes\n")
+
+    def test_summary(self):
+        a = self.write("a.gds", b"\x00\x06\x00\x02" * 100)
+        b = self.write("b.gds", b"\x00\x06\x00\x03" * 100)
+        summary = "Binary files %s and %s differ\n" % (a, b)
+        assert list(vpm.Package.iter_diff(a, b)) == [summary]
+        a, b = self.write("a.v", "a" * 100), self.write("b.v", "b" * 100)
+        hunks = list(vpm.Package.iter_diff(a, b, max_size=10))
+        assert len(hunks) == 1 and "too large to diff" in hunks[0]
+
+    def test_stream(self):
+        pkga, pkgb = vpm.Package("ip"), vpm.Package("ip")
+        pkga.designs = [self.write("a/core.v", "a\n"), self.write("a/ports.v", "p\n")]
+        pkgb.designs = [self.write("b/core.v", "b\n"), self.write("b/ports.v", "p\n")]
+        db = vpm.Package.unified_diff(pkga, pkgb, no_print=True, stream=True)
+        assert list(db["designs"].keys()) == ["core.v"]
+        assert isinstance(db["designs"]["core.v"], types.GeneratorType)
+        assert "+b\n" in "".join(db["designs"]["core.v"])
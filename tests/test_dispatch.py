@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import io
+import os
+import sys
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+vpm_module = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(vpm_module)
+
+import vpm
+
+
+class DispatchTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tests_dir = os.path.dirname(os.path.abspath(__file__))
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        sys.stdout, sys.stderr = None, None
+        self.dir = tempfile.mkdtemp()
+        os.environ["VPM_CACHE_DIR"] = os.path.join(self.dir, "cache")
+        for name in ["empty_platform", "sar", "resync"]:
+            shutil.copytree(os.path.join(self.tests_dir, name),
+                            os.path.join(self.dir, name))
+        self.platform = os.path.join(self.dir, "empty_platform")
+        os.remove(os.path.join(self.platform, "package.yml"))
+        os.chdir(self.platform)
+        vpm.clear_index_cache()
+        vpm.default_package()
+        self.src = os.path.join(self.dir, "resync", "edge_resync.v")
+        self.dest = os.path.join(self.platform, "design", "resync", "edge_resync.v")
+
+    def tearDown(self):
+        sys.stdout = sys.__stdout__
+        sys.stderr = sys.__stderr__
+        os.environ.pop("VPM_CACHE_DIR", None)
+        os.chdir(self.cwd)
+        shutil.rmtree(self.dir, ignore_errors=True)
+        vpm.clear_index_cache()
+
+    def set_mode(self, mode: str):
+        with open(os.path.join(self.platform, "vpm.config"), "a") as fp:
+            fp.write("\n[install]\nmode=%s\n" % mode)
+
+    def test_hardlink(self):
+        self.set_mode("hardlink")
+        vpm.install_package("resync")
+        assert os.stat(self.dest).st_ino == os.stat(self.src).st_ino
+        # a copy over it does not write through the link
+        vpm.install_file(os.path.join(self.dir, "sar", "design", "core.v"), self.dest)
+        assert os.stat(self.dest).st_ino != os.stat(self.src).st_ino
+        with open(self.src, "r") as fp:
+            assert "module" in fp.read()
+
+    def test_symlink(self):
+        self.set_mode("symlink")
+        vpm.install_package("resync")
+        assert os.path.islink(self.dest)
+        assert os.readlink(self.dest) == self.src
+
+    def test_modes(self):
+        files = [
+            (os.path.join(self.dir, "sar", "design", "core.v"),
+             os.path.join(self.platform, "a", "core.v")),
+            (os.path.join(self.dir, "sar", "design", "ports.v"),
+             os.path.join(self.platform, "b", "ports.v")),
+            (self.src, os.path.join(self.platform, "b", "edge_resync.v")),
+        ]
+        for mode in vpm.INSTALL_MODES:
+            modes = vpm.install_files(files, mode=mode, jobs=2)
+            # reflink falls back to a copy where not supported
+            assert set(modes) <= set([mode, "copy", None])
+            for src, dest in files:
+                with open(src, "rb") as fa, open(dest, "rb") as fb:
+                    assert fa.read() == fb.read()
+        # unknown modes copy
+        self.set_mode("zerocopy")
+        assert vpm.install_mode() == "copy"
+
+    def update(self, name: str):
+        sys.stdout = io.StringIO()
+        vpm.install_package(name, force=True)
+        output, sys.stdout = sys.stdout.getvalue(), None
+        return [line for line in output.splitlines() if "files copied" in line]
+
+    def test_incremental(self):
+        vpm.install_package("adc_sar")
+        core = os.path.join(self.platform, "design", "adc_sar", "core.v")
+        ino = os.stat(core).st_ino
+        # nothing changed
+        assert self.update("adc_sar") == [
+            "resync: 0 files copied, 1 skipped, 0 removed",
+            "adc_sar: 0 files copied, 2 skipped, 0 removed"
+        ]
+        assert os.stat(core).st_ino == ino
+        # touched but identical
+        os.utime(os.path.join(self.dir, "sar", "design", "core.v"), None)
+        assert self.update("adc_sar")[-1] == "adc_sar: 0 files copied, 2 skipped, 0 removed"
+        # one file modified, one removed from the package
+        with open(os.path.join(self.dir, "sar", "design", "core.v"), "a") as fp:
+            fp.write("// fixed\n")
+        pkg_file = os.path.join(self.dir, "sar", "package.yml")
+        with open(pkg_file, "r") as fp:
+            content = fp.read()
+        with open(pkg_file, "w") as fp:
+            fp.write(content.replace("  - ./design/ports.v\n", ""))
+        assert self.update("adc_sar")[-1] == "adc_sar: 1 files copied, 0 skipped, 1 removed"
+        design = os.path.join(self.platform, "design", "adc_sar")
+        assert not os.path.exists(os.path.join(design, "ports.v"))
+        with open(core, "r") as fp:
+            assert fp.read() == "// fixed\n"
+
+    def test_several(self):
+        writes = []
+        write_package = vpm.serialization.write_package
+
+        def count_writes(pkg, *args, **kwargs):
+            writes.append(pkg)
+            return write_package(pkg, *args, **kwargs)
+
+        vpm.serialization.write_package = count_writes
+        try:
+            with open("requirements.txt", "w") as fp:
+                fp.write("# platform ips\nadc_sar >= 0.0.1\n\nresync  # sync\n")
+            reqs = vpm.read_requirements("requirements.txt")
+            assert reqs == ["adc_sar >= 0.0.1", "resync"]
+            plan = vpm.install_packages(vpm.read_requirements("requirements.txt"))
+        finally:
+            vpm.serialization.write_package = write_package
+        assert [pkg.name for pkg, _ in plan] == ["resync", "adc_sar"]
+        assert len(writes) == 1
+        names = sorted(dep.name for dep in vpm.read_package().dependencies)
+        assert names == ["adc_sar", "resync"]
+        assert os.path.exists(self.dest)
+        assert os.path.exists(os.path.join(self.platform, "design", "adc_sar", "core.v"))
+
+    def test_subdirectory(self):
+        # run from a directory of the platform
+        os.makedirs(os.path.join(self.platform, "sub"))
+        os.chdir(os.path.join(self.platform, "sub"))
+        vpm.install_package("resync")
+        assert os.path.exists(self.dest)
+        assert not os.listdir(os.path.join(self.platform, "sub"))
+        assert [dep.name for dep in vpm.read_package().dependencies] == ["resync"]
+        locked = vpm.read_lock()["packages"]["resync"]
+        assert list(locked["files"]) == ["design/resync/edge_resync.v"]
+        assert vpm.lock_path() == os.path.join(self.platform, "vpm.lock")
+
+    def test_satisfied(self):
+        vpm.install_package("adc_sar")
+        # the dependency installed is not the version resolved
+        with vpm.package_transaction() as pkg:
+            pkg.dependencies = [dep for dep in pkg.dependencies if dep.name != "resync"]
+            pkg.dependencies.append(vpm.Package.parse_package_name("resync 0.1.0"))
+        plan = vpm.resolve([vpm.Package.parse_package_name("adc_sar")])
+        sys.stdout = io.StringIO()
+        vpm.install_plan(plan)
+        output, sys.stdout = sys.stdout.getvalue(), None
+        assert "package adc_sar 0.0.1 already satisfied" in output
+        assert "resync 0.0.2 installed" in output
+        versions = {dep.name: str(dep.version) for dep in vpm.read_package().dependencies}
+        assert versions == {"adc_sar": "0.0.1", "resync": "0.0.2"}
+
+    def test_staging(self):
+        vpm.install_package("adc_sar")
+        design = os.path.join(self.platform, "design", "adc_sar")
+        for name in ["core.v", "ports.v"]:
+            with open(os.path.join(self.dir, "sar", "design", name), "a") as fp:
+                fp.write("// fixed\n")
+        with open(os.path.join(self.platform, "vpm.config"), "a") as fp:
+            fp.write("\n[install]\njobs=1\n")
+        # the download of the second file fails
+        install_file = vpm.install.install_file
+        calls = []
+
+        def failing(src, dest, mode="copy"):
+            calls.append(dest)
+            if len(calls) > 1:
+                raise OSError("connection reset")
+            return install_file(src, dest, mode)
+
+        vpm.install.install_file = failing
+        try:
+            with self.assertRaises(OSError):
+                vpm.install_package("adc_sar", force=True)
+        finally:
+            vpm.install.install_file = install_file
+        # the previous install is intact
+        assert sorted(os.listdir(design)) == ["core.v", "ports.v"]
+        with open(os.path.join(design, "core.v"), "r") as fp:
+            assert "// fixed" not in fp.read()
+        assert not os.path.exists(vpm.staging_path(design))
+        # what an interrupted install left is not installed
+        os.makedirs(vpm.staging_path(design))
+        with open(os.path.join(vpm.staging_path(design), "stray.v"), "w") as fp:
+            fp.write("// stray\n")
+        assert self.update("adc_sar")[-1] == "adc_sar: 2 files copied, 0 skipped, 0 removed"
+        assert not os.path.exists(vpm.staging_path(design))
+        assert sorted(os.listdir(os.path.dirname(design))) == ["adc_sar", "resync"]
+        for name in ["core.v", "ports.v"]:
+            with open(os.path.join(design, name), "r") as fp:
+                assert fp.read().endswith("// fixed\n")
+
+    def test_concurrent(self):
+        vpm.install_package("adc_sar")
+        # processes updating the same platform wait for each other
+        core = os.path.join(self.dir, "sar", "design", "core.v")
+        script = "import sys; sys.path.insert(0, %r); import vpm\n" \
+                 "for i in range(10):\n" \
+                 "    with open(%r, 'a') as fp:\n" \
+                 "        fp.write('// fixed\\n')\n" \
+                 "    vpm.install_package('adc_sar', force=True)\n" % (vpm_module, core)
+        procs = [subprocess.Popen([sys.executable, "-c", script], stdout=subprocess.DEVNULL,
+                                  stderr=subprocess.PIPE) for _ in range(3)]
+        for proc in procs:
+            _, err = proc.communicate()
+            assert proc.returncode == 0, err
+        design = os.path.join(self.platform, "design")
+        assert sorted(os.listdir(design)) == ["adc_sar", "resync"]
+        assert sorted(os.listdir(os.path.join(design, "adc_sar"))) == ["core.v", "ports.v"]
+        with open(core, "r") as fa, open(os.path.join(design, "adc_sar", "core.v")) as fb:
+            assert fa.read() == fb.read()
+
+    def test_remove(self):
+        vpm.install_package("adc_sar")
+        design = os.path.join(self.platform, "design", "adc_sar")
+        # files left in the package directory
+        os.makedirs(os.path.join(design, "sim"))
+        with open(os.path.join(design, "sim", "waves.vcd"), "w") as fp:
+            fp.write("$end\n")
+        # neither the index nor the sources are read
+        shutil.rmtree(os.path.join(self.dir, "sar"))
+        vpm.clear_index_cache()
+        os.environ["VPM_CACHE_DIR"] = os.path.join(self.dir, "other")
+        vpm.remove_package("adc_sar")
+        assert not os.path.exists(os.path.join(self.dir, "other"))
+        assert not os.path.exists(design)
+        assert os.path.exists(self.dest)
+        assert [dep.name for dep in vpm.read_package().dependencies] == ["resync"]
+        assert list(vpm.read_lock()["packages"].keys()) == ["resync"]
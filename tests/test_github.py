@@ -47,10 +47,18 @@ class DefaultTests(unittest.TestCase):
             os.remove(os.path.join(cls.tests_dir, "platform_git_https/package.yml"))
             shutil.rmtree(os.path.join(cls.tests_dir, "platform_git_https/design"),
                           ignore_errors=True)
+        for name in ["vpm.lock", ".package.yml.lock"]:
+            path = os.path.join(cls.tests_dir, "platform_git_https", name)
+            if os.path.exists(path):
+                os.remove(path)
         if os.path.exists(os.path.join(cls.tests_dir, "platform_git_ssh/package.yml")):
             os.remove(os.path.join(cls.tests_dir, "platform_git_ssh/package.yml"))
             shutil.rmtree(os.path.join(cls.tests_dir, "platform_git_ssh/design"),
                           ignore_errors=True)
+        for name in ["vpm.lock", ".package.yml.lock"]:
+            path = os.path.join(cls.tests_dir, "platform_git_ssh", name)
+            if os.path.exists(path):
+                os.remove(path)
 
     @staticmethod
     def exact_list(lista: list, refs: list):
@@ -89,6 +97,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v"
         ], os.getcwd())
         # install sar (does not exist)
@@ -98,6 +108,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v"
         ], os.getcwd())
         # install adc_sar
@@ -107,6 +119,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v",
             "./design/adc_sar/core.v",
             "./design/adc_sar/ports.v"
@@ -118,6 +132,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v",
             "./design/adc_sar/core.v",
             "./design/adc_sar/ports.v"
@@ -129,6 +145,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v",
             "./design/adc_sar/core.v",
             "./design/adc_sar/ports.v"
@@ -153,6 +171,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v",
             "./design/adc_sar/core.v",
             "./design/adc_sar/ports.v"
@@ -164,6 +184,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v",
             "./design/adc_sar/core.v",
             "./design/adc_sar/ports.v"
@@ -175,6 +197,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v",
             "./design/adc_sar/core.v",
             "./design/adc_sar/ports.v"
@@ -186,6 +210,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v"
         ], os.getcwd())
         # remove resync
@@ -194,7 +220,9 @@ class DefaultTests(unittest.TestCase):
         files = list(Path(os.getcwd()).rglob("*.*"))
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
-            "./package.yml"
+            "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock"
         ], os.getcwd())
 
     @ordered
@@ -215,6 +243,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v"
         ], os.getcwd())
         # install sar (does not exist)
@@ -224,6 +254,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v"
         ], os.getcwd())
         # install adc_sar
@@ -233,6 +265,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v",
             "./design/adc_sar/core.v",
             "./design/adc_sar/ports.v"
@@ -244,6 +278,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v",
             "./design/adc_sar/core.v",
             "./design/adc_sar/ports.v"
@@ -255,6 +291,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v",
             "./design/adc_sar/core.v",
             "./design/adc_sar/ports.v"
@@ -279,6 +317,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v",
             "./design/adc_sar/core.v",
             "./design/adc_sar/ports.v"
@@ -290,6 +330,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v",
             "./design/adc_sar/core.v",
             "./design/adc_sar/ports.v"
@@ -301,6 +343,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v",
             "./design/adc_sar/core.v",
             "./design/adc_sar/ports.v"
@@ -312,6 +356,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v"
         ], os.getcwd())
         # remove resync
@@ -320,5 +366,7 @@ class DefaultTests(unittest.TestCase):
         files = list(Path(os.getcwd()).rglob("*.*"))
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
-            "./package.yml"
+            "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock"
         ], os.getcwd())
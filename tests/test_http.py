@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import io
+import os
+import sys
+import time
+import shutil
+import socket
+import tempfile
+import unittest
+
+from pathlib import Path
+from urllib.error import HTTPError
+
+vpm_module = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(vpm_module)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import vpm
+
+from github_server import FakeGithub
+
+
+class HttpTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tests_dir = os.path.dirname(os.path.abspath(__file__))
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        sys.stdout, sys.stderr = None, None
+        self.dir = tempfile.mkdtemp()
+        # repository served by the stand-in
+        self.repo = os.path.join(self.dir, "repo")
+        shutil.copytree(os.path.join(self.tests_dir, "sar"), os.path.join(self.repo, "sar"))
+        shutil.copytree(os.path.join(self.tests_dir, "resync"),
+                        os.path.join(self.repo, "resync"))
+        os.remove(os.path.join(self.repo, "sar", "vpm.config"))
+        # platform using it
+        self.platform = os.path.join(self.dir, "platform")
+        os.makedirs(self.platform)
+        with open(os.path.join(self.platform, "vpm.config"), "w+") as fp:
+            fp.write("[repositories]\n")
+            fp.write("sources = ./\n")
+            fp.write("    https://github.com/user/repo/tree/master/sar\n")
+            fp.write("    https://github.com/user/repo/tree/master/resync\n")
+        os.chdir(self.platform)
+        vpm.default_package()
+        os.environ["VPM_CACHE_DIR"] = os.path.join(self.dir, "cache")
+        vpm.clear_index_cache()
+        self.server = FakeGithub(self.repo).__enter__()
+        os.environ["VPM_GITHUB_API"] = self.server.url
+
+    def tearDown(self):
+        sys.stdout = sys.__stdout__
+        sys.stderr = sys.__stderr__
+        self.server.__exit__()
+        vpm.github_session().close()
+        vpm.clear_index_cache()
+        os.environ.pop("VPM_CACHE_DIR", None)
+        os.environ.pop("VPM_GITHUB_API", None)
+        os.chdir(self.cwd)
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def installed_files(self):
+        return sorted(
+            str(f.relative_to(self.platform)) for f in Path(self.platform).rglob("*.v")
+        )
+
+    def test_install(self):
+        vpm.install_package("adc_sar")
+        assert self.installed_files() == [
+            "design/adc_sar/core.v",
+            "design/adc_sar/ports.v",
+            "design/resync/edge_resync.v"
+        ]
+        with open(os.path.join(self.platform, "design/adc_sar/core.v"), "r") as fp:
+            with open(os.path.join(self.repo, "sar/design/core.v"), "r") as ref:
+                assert fp.read() == ref.read()
+        # connections are kept alive
+        assert self.server.connections < len(self.server.requests)
+
+    def test_download_all(self):
+        tree = vpm.github_tree("user/repo")["tree"]
+        files = [f for f in tree if f["path"].endswith(".v")]
+        dir = tempfile.mkdtemp(dir=self.dir)
+        paths = vpm.github_download_all(files, dir, jobs=4)
+        assert [os.path.basename(p) for p in paths] == \
+               [os.path.basename(f["path"]) for f in files]
+        assert all(os.path.exists(p) for p in paths)
+        # the next package reuses the threads and connections of the session
+        vpm.cache_prune(limit=0)
+        vpm.github_download_all(files, tempfile.mkdtemp(dir=self.dir), jobs=4)
+        assert self.server.connections <= 1 + 4
+
+    def test_retries(self):
+        # nothing listens on the port
+        sock = socket.socket()
+        sock.bind(("127.0.0.1", 0))
+        url = "http://127.0.0.1:%d/repos/user/repo" % sock.getsockname()[1]
+        sock.close()
+        with self.assertRaises(HTTPError) as ctx:
+            vpm.github_request(url)
+        assert ctx.exception.code == 503
+        assert "ConnectionRefusedError" in str(ctx.exception.msg)
+
+    def test_rate_limit(self):
+        self.server.rate_limited = 1
+        start = time.time()
+        res = vpm.github_tree("user/repo")
+        assert res.get("tree")
+        # waited for the announced reset
+        assert vpm.github_session().reset > start
+        assert time.time() >= vpm.github_session().reset
+        assert len(self.server.requests) == 2
+
+    def test_blob_cache(self):
+        vpm.install_package("adc_sar")
+        stats = vpm.cache_stats(no_print=True)
+        # 2 package.yml and 3 verilog files (core.v and ports.v are empty)
+        assert stats["count"] == 4
+        # reinstall without downloading any file
+        count = len(self.server.requests)
+        vpm.install_package("adc_sar", force=True)
+        assert not [r for r in self.server.requests[count:] if "/blobs/" in r]
+        assert len(self.installed_files()) == 3
+        # least recently used are evicted first
+        assert vpm.cache_prune(limit=stats["size"]) == 0
+        assert vpm.cache_prune(limit=0) == 4
+        assert vpm.cache_stats(no_print=True)["count"] == 0
+        # the size is tracked: the cache is scanned only above the limit
+        vpm.install_package("adc_sar", force=True)
+        cache_blobs, scans = vpm.cache.cache_blobs, []
+        vpm.cache.cache_blobs = lambda: scans.append(1) or cache_blobs()
+        try:
+            assert vpm.cache_check() == 0
+            assert not scans
+            with open("vpm.config", "a") as fp:
+                fp.write("\n[cache]\nsize=1\n")
+            assert vpm.cache_check() > 0
+            assert scans == [1]
+        finally:
+            vpm.cache.cache_blobs = cache_blobs
+        # an invalid size is reported
+        with open("vpm.config", "r") as fp:
+            content = fp.read()
+        with open("vpm.config", "w") as fp:
+            fp.write(content.replace("size=1", "size=lots"))
+        sys.stdout = io.StringIO()
+        vpm.cache_stats()
+        output, sys.stdout = sys.stdout.getvalue(), None
+        assert "invalid [cache] size 'lots'" in output
+        assert vpm.cache_prune() == 0
+
+    def test_lazy(self):
+        pkgs = list(vpm.list_available(no_print=True))
+        assert sorted(p.name for p in pkgs) == ["adc_sar", "basic_package", "resync"]
+        # one tree and the package.yml of the two packages
+        blobs = [r for r in self.server.requests if "/blobs/" in r]
+        assert len(blobs) == 2
+        pkg = vpm.read_package("https://github.com/user/repo/tree/master/sar")
+        assert pkg.designs == ["sar/design/core.v", "sar/design/ports.v"]
+        assert isinstance(pkg.designs[0], vpm.RemoteFile)
+        assert len([r for r in self.server.requests if "/blobs/" in r]) == 2
+        # downloaded on access
+        with open(vpm.local_path(pkg.designs[0]), "r") as fp:
+            assert fp.read() == ""
+        assert len([r for r in self.server.requests if "/blobs/" in r]) == 3
+
+    def test_tree_cache(self):
+        tree = vpm.github_tree("user/repo")
+        # fetched once per process
+        assert vpm.github_tree("user/repo") is tree
+        assert len(self.server.requests) == 1
+        # revalidated with its etag
+        vpm.clear_tree_cache()
+        assert vpm.github_tree("user/repo") == tree
+        assert self.server.statuses == [200, 304]
+        # a modified repository is fetched again
+        with open(os.path.join(self.repo, "resync", "edge_resync.v"), "a") as fp:
+            fp.write("// modified\n")
+        vpm.clear_tree_cache()
+        assert vpm.github_tree("user/repo")["sha"] != tree["sha"]
+        assert self.server.statuses == [200, 304, 200]
+
+    def test_raw_blob(self):
+        data = bytes(range(256)) * 1024
+        with open(os.path.join(self.repo, "resync", "cells.lib"), "wb") as fp:
+            fp.write(data)
+        tree = vpm.github_tree("user/repo")["tree"]
+        entry = [f for f in tree if f["path"] == "resync/cells.lib"][0]
+        with open(vpm.github_fetch(entry), "rb") as fp:
+            assert fp.read() == data
+        # a corrupted download is not kept
+        vpm.cache_prune(limit=0)
+        self.server.corrupted = True
+        with self.assertRaises(IOError):
+            vpm.github_fetch(entry)
+        assert vpm.cache_get(entry["sha"]) is None
+        assert vpm.cache_stats(no_print=True)["count"] == 0
+        # without sha, cached by the sha of the download
+        self.server.corrupted = False
+        path = vpm.github_fetch({"url": entry["url"], "size": entry["size"]})
+        assert path == vpm.blob_path(entry["sha"])
+        assert os.listdir(vpm.cache_dir("blobs")) == [entry["sha"][:2]]
+        assert os.listdir(os.path.dirname(path)) == [entry["sha"]]
+
+    def test_frozen(self):
+        vpm.install_package("adc_sar")
+        lock = vpm.read_lock()
+        entry = lock["packages"]["resync"]
+        assert entry["commit"] == vpm.github_tree("user/repo")["sha"]
+        assert entry["source"] == "https://github.com/user/repo/tree/master/resync"
+        shutil.rmtree(os.path.join(self.platform, "design"))
+        # blobs are taken from the cache, the tree is not listed again
+        count = len(self.server.requests)
+        assert vpm.install_frozen() == []
+        assert len(self.server.requests) == count
+        assert self.installed_files() == [
+            "design/adc_sar/core.v",
+            "design/adc_sar/ports.v",
+            "design/resync/edge_resync.v"
+        ]
+        # and downloaded by their sha otherwise
+        vpm.cache_prune(limit=0)
+        shutil.rmtree(os.path.join(self.platform, "design"))
+        assert vpm.install_frozen() == []
+        assert all("/blobs/" in r for r in self.server.requests[count:])
+        assert len(self.installed_files()) == 3
+
+    def test_corrupted(self):
+        vpm.install_package("adc_sar")
+        os.remove(vpm.lock_path())
+        vpm.cache_prune(limit=0)
+        with open(os.path.join(self.platform, "design/resync/edge_resync.v"), "a") as fp:
+            fp.write("// customized\n")
+        count = len(self.server.requests)
+        pkgs = [p for p in vpm.list_corrupted(no_print=True) if p]
+        assert pkgs == [{"designs": {"edge_resync.v": None}}]
+        # compared with the git sha of the tree, only package.yml are read
+        shas = [f["sha"] for f in vpm.github_tree("user/repo")["tree"]
+                if f["path"].endswith(".v")]
+        assert not [r for r in self.server.requests[count:] if r.split("/")[-1] in shas]
+
+    def test_offline(self):
+        vpm.install_package("adc_sar")
+        shutil.rmtree(os.path.join(self.platform, "design"))
+        os.environ["VPM_OFFLINE"] = "1"
+        try:
+            vpm.clear_index_cache()
+            count = len(self.server.requests)
+            # answered from the index, the tree cache and the blob cache
+            names = sorted(pkg.name for pkg in vpm.list_available(no_print=True))
+            assert names == ["adc_sar", "basic_package", "resync"]
+            vpm.install_package("adc_sar", force=True)
+            assert len(self.installed_files()) == 3
+            assert list(vpm.list_corrupted(no_print=True)) == [None, None]
+            assert len(self.server.requests) == count
+            # a file not cached fails at once
+            vpm.cache_prune(limit=0)
+            shutil.rmtree(os.path.join(self.platform, "design"))
+            with self.assertRaises(vpm.OfflineError):
+                vpm.install_frozen()
+            assert len(self.server.requests) == count
+        finally:
+            os.environ.pop("VPM_OFFLINE", None)
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import os
+import sys
+import threading
+import shutil
+import tempfile
+import unittest
+
+vpm_module = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(vpm_module)
+
+import vpm
+
+
+class IndexTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tests_dir = os.path.dirname(os.path.abspath(__file__))
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        sys.stdout, sys.stderr = None, None
+        self.dir = tempfile.mkdtemp()
+        os.environ["VPM_CACHE_DIR"] = os.path.join(self.dir, "cache")
+        for name in ["platform", "sar", "resync"]:
+            shutil.copytree(os.path.join(self.tests_dir, name),
+                            os.path.join(self.dir, name))
+            # not modified recently
+            os.utime(os.path.join(self.dir, name, "package.yml"), (0, 0))
+        os.chdir(os.path.join(self.dir, "platform"))
+        vpm.clear_index_cache()
+
+    def tearDown(self):
+        sys.stdout = sys.__stdout__
+        sys.stderr = sys.__stderr__
+        os.environ.pop("VPM_CACHE_DIR", None)
+        os.chdir(self.cwd)
+        shutil.rmtree(self.dir, ignore_errors=True)
+        vpm.clear_index_cache()
+
+    def test_build(self):
+        index = vpm.build_index()
+        assert os.path.exists(vpm.index_path())
+        assert len(index["sources"]) == 3
+        assert list(index["packages"]["adc_sar"].keys()) == ["0.0.1"]
+        entry = index["packages"]["resync"]["0.0.2"][0]
+        assert entry["path"] == os.path.join(self.dir, "resync")
+        assert len(entry["checksum"]) == 64
+        # lookups
+        assert vpm.find_sources(vpm.Package("resync")) == [entry["path"]]
+        assert vpm.find_sources(vpm.Package("resync", "0.0.3")) == []
+        assert vpm.find_sources(vpm.Package("sar")) == []
+
+    def test_incremental(self):
+        vpm.build_index()
+        # nothing changed: the index is reused
+        index = vpm.read_index()
+        index["sources"][os.path.join(self.dir, "sar")]["packages"][0]["name"] = "cached"
+        vpm.write_index(index)
+        assert "cached" in vpm.build_index()["packages"]
+        # a new version of resync is indexed again
+        pkg_file = os.path.join(self.dir, "resync", "package.yml")
+        with open(pkg_file, "r") as fp:
+            content = fp.read()
+        with open(pkg_file, "w+") as fp:
+            fp.write(content.replace("0.0.2", "0.1.0"))
+        index = vpm.build_index()
+        assert "cached" in index["packages"]
+        assert list(index["packages"]["resync"].keys()) == ["0.1.0"]
+
+    def test_unchanged(self):
+        # sources not in sorted order
+        with open("vpm.config", "r") as fp:
+            content = fp.read()
+        with open("vpm.config", "w") as fp:
+            fp.write(content.replace("../resync\n        ../sar",
+                                     "../sar\n        ../resync"))
+        vpm.build_index()
+        ino = os.stat(vpm.index_path()).st_ino
+        # nothing changed: the index is not written again
+        vpm.clear_index_cache()
+        vpm.build_index()
+        assert os.stat(vpm.index_path()).st_ino == ino
+
+    def test_concurrent(self):
+        vpm.build_index()
+        with open("vpm.config", "a") as fp:
+            fp.write("\n[index]\ntimeout=0.5\n")
+        signature = vpm.index.source_signature
+        release = threading.Event()
+        daemons = []
+
+        def unreliable(src):
+            if src.endswith("sar"):
+                # never answers until the end of the test
+                daemons.append(threading.current_thread().daemon)
+                release.wait()
+            if src.endswith("resync"):
+                raise OSError("stale file handle")
+            return signature(src)
+
+        vpm.index.source_signature = unreliable
+        try:
+            results = [(os.path.basename(src), type(error).__name__ if error else None)
+                       for src, _, _, error in vpm.scan_sources(
+                           list(vpm.list_sources(no_print=True)), timeout=0.5)]
+            # in the order the scans end
+            assert sorted(results[:2]) == [("", None), ("resync", "OSError")]
+            assert results[2] == ("sar", "TimeoutError")
+            # the scan left behind does not keep the interpreter alive
+            assert daemons == [True]
+            # the sources failing keep their previous entry
+            index = vpm.build_index(force=True)
+            names = sorted(index["packages"].keys())
+            assert names == ["adc_sar", "my super project", "resync"]
+            sources = index["sources"]
+            assert sources[os.path.join(self.dir, "sar")]["racy"]
+            assert sources[os.path.join(self.dir, "resync")]["racy"]
+        finally:
+            release.set()
+            vpm.index.source_signature = signature
+
+    def test_stream(self):
+        vpm.build_index()
+        vpm.clear_index_cache()
+        signature = vpm.index.source_signature
+        release = threading.Event()
+
+        def blocking(src):
+            if src.endswith("sar"):
+                release.wait()
+            return signature(src)
+
+        vpm.index.source_signature = blocking
+        try:
+            entries = vpm.stream_entries()
+            # the sources before sar are listed while it is scanned
+            names = [next(entries)["name"], next(entries)["name"]]
+            assert names == ["my super project", "resync"]
+            release.set()
+            assert [entry["name"] for entry in entries] == ["adc_sar"]
+        finally:
+            release.set()
+            vpm.index.source_signature = signature
@@ -47,6 +47,10 @@ class DefaultTests(unittest.TestCase):
             os.remove(os.path.join(cls.tests_dir, "empty_platform/package.yml"))
             shutil.rmtree(os.path.join(cls.tests_dir, "empty_platform/design"),
                           ignore_errors=True)
+        for name in ["vpm.lock", ".package.yml.lock"]:
+            path = os.path.join(cls.tests_dir, "empty_platform", name)
+            if os.path.exists(path):
+                os.remove(path)
 
     @staticmethod
     def exact_list(lista: list, refs: list):
@@ -85,6 +89,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v"
         ], os.getcwd())
         # install sar (does not exist)
@@ -94,6 +100,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v"
         ], os.getcwd())
         # install adc_sar
@@ -103,6 +111,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v",
             "./design/adc_sar/core.v",
             "./design/adc_sar/ports.v"
@@ -114,6 +124,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v",
             "./design/adc_sar/core.v",
             "./design/adc_sar/ports.v"
@@ -125,6 +137,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v",
             "./design/adc_sar/core.v",
             "./design/adc_sar/ports.v"
@@ -139,6 +153,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v",
             "./design/adc_sar/core.v",
             "./design/adc_sar/ports.v"
@@ -150,6 +166,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v",
             "./design/adc_sar/core.v",
             "./design/adc_sar/ports.v"
@@ -161,6 +179,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v",
             "./design/adc_sar/core.v",
             "./design/adc_sar/ports.v"
@@ -172,6 +192,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v"
         ], os.getcwd())
         # remove resync
@@ -180,7 +202,9 @@ class DefaultTests(unittest.TestCase):
         files = list(Path(os.getcwd()).rglob("*.*"))
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
-            "./package.yml"
+            "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock"
         ], os.getcwd())
 
     @ordered
@@ -191,7 +215,9 @@ class DefaultTests(unittest.TestCase):
         files = list(Path(os.getcwd()).rglob("*.*"))
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
-            "./package.yml"
+            "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock"
         ], os.getcwd())
         # install adc_sar + resync
         vpm.install_package("adc_sar")
@@ -200,6 +226,8 @@ class DefaultTests(unittest.TestCase):
         DefaultTests.exact_filelist(files, [
             "./vpm.config",
             "./package.yml",
+            "./vpm.lock",
+            "./.package.yml.lock",
             "./design/resync/edge_resync.v",
             "./design/adc_sar/core.v",
             "./design/adc_sar/ports.v"
@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
 # coding: utf-8
 
+import io
 import os
 import sys
+import json
 import unittest
 
 vpm_module = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -96,6 +98,16 @@ class ListTests(unittest.TestCase):
         assert len(pkgs) == 1
         assert pkgs[0].name == "resync"
 
+    def test_outdated_json(self):
+        # move in outdated
+        os.chdir("%s/outdated" % self.tests_dir)
+        sys.stdout = io.StringIO()
+        list(vpm.list_outdated(output="json"))
+        output, sys.stdout = sys.stdout.getvalue(), None
+        assert [json.loads(line) for line in output.splitlines()] == [
+            {"name": "resync", "installed": "0.0.1", "latest": "0.0.2"}
+        ]
+
     def test_corrupted(self):
         # move in platform
         os.chdir("%s/platform" % self.tests_dir)
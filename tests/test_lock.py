@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import io
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+vpm_module = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(vpm_module)
+
+import vpm
+
+
+class LockTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tests_dir = os.path.dirname(os.path.abspath(__file__))
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        sys.stdout, sys.stderr = None, None
+        self.dir = tempfile.mkdtemp()
+        os.environ["VPM_CACHE_DIR"] = os.path.join(self.dir, "cache")
+        for name in ["empty_platform", "sar", "resync"]:
+            shutil.copytree(os.path.join(self.tests_dir, name),
+                            os.path.join(self.dir, name))
+        self.platform = os.path.join(self.dir, "empty_platform")
+        os.remove(os.path.join(self.platform, "package.yml"))
+        os.chdir(self.platform)
+        vpm.clear_index_cache()
+        vpm.default_package()
+
+    def tearDown(self):
+        sys.stdout = sys.__stdout__
+        sys.stderr = sys.__stderr__
+        os.environ.pop("VPM_CACHE_DIR", None)
+        os.chdir(self.cwd)
+        shutil.rmtree(self.dir, ignore_errors=True)
+        vpm.clear_index_cache()
+
+    def test_lock(self):
+        vpm.install_package("adc_sar")
+        lock = vpm.read_lock()
+        assert sorted(lock["packages"].keys()) == ["adc_sar", "resync"]
+        resync = lock["packages"]["resync"]
+        assert resync["version"] == "0.0.2"
+        assert resync["source"] == os.path.join(self.dir, "resync")
+        entry = resync["files"]["design/resync/edge_resync.v"]
+        assert entry["origin"] == os.path.join(self.dir, "resync", "edge_resync.v")
+        assert entry["sha256"] == vpm.file_sha256(entry["origin"])
+        # removed packages are unpinned
+        vpm.remove_package("adc_sar")
+        assert list(vpm.read_lock()["packages"].keys()) == ["resync"]
+
+    def test_frozen(self):
+        vpm.install_package("adc_sar")
+        shutil.rmtree(os.path.join(self.platform, "design"))
+        os.remove(os.path.join(self.platform, "package.yml"))
+        vpm.default_package()
+        # neither the index nor the sources are read
+        vpm.clear_index_cache()
+        os.environ["VPM_CACHE_DIR"] = os.path.join(self.dir, "other")
+        assert vpm.install_frozen() == []
+        assert not os.path.exists(os.path.join(self.dir, "other"))
+        assert os.path.exists(os.path.join(self.platform, "design/adc_sar/core.v"))
+        assert os.path.exists(os.path.join(self.platform, "design/resync/edge_resync.v"))
+        assert vpm.is_package_installed(vpm.Package("resync", "0.0.2"))
+        # a source modified since the lock is refused
+        with open(os.path.join(self.dir, "resync", "edge_resync.v"), "a") as fp:
+            fp.write("// modified\n")
+        dest = os.path.join(self.platform, "design/resync/edge_resync.v")
+        os.remove(dest)
+        assert vpm.install_frozen() == ["resync"]
+        # the modified source is not installed
+        assert not os.path.exists(dest)
+        assert os.listdir(os.path.dirname(dest)) == []
+        # nor does it replace the installed file
+        shutil.copyfile(os.path.join(self.tests_dir, "resync", "edge_resync.v"), dest)
+        with open(dest, "a") as fp:
+            fp.write("// customized\n")
+        with open(dest, "r") as fp:
+            content = fp.read()
+        assert vpm.install_frozen() == ["resync"]
+        with open(dest, "r") as fp:
+            assert fp.read() == content
+
+    def test_corrupted(self):
+        vpm.install_package("adc_sar")
+        assert list(vpm.list_corrupted(no_print=True)) == [None, None]
+        # compared with the hashes of vpm.lock, not the sources
+        with open(os.path.join(self.dir, "sar", "design", "ports.v"), "a") as fp:
+            fp.write("// not installed\n")
+        core = os.path.join(self.platform, "design", "adc_sar", "core.v")
+        with open(core, "a") as fp:
+            fp.write("// customized\n")
+        pkgs = [p for p in vpm.list_corrupted(no_print=True) if p]
+        assert pkgs == [{"designs": {"core.v": None}}]
+        # the diff only on request
+        pkgs = [p for p in vpm.list_corrupted(no_print=True, diff=True) if p]
+        assert "+// customized" in pkgs[0]["designs"]["core.v"]
+
+    def test_corrupted_json(self):
+        vpm.install_package("adc_sar")
+        edge_resync = os.path.join(self.platform, "design", "resync", "edge_resync.v")
+        with open(edge_resync, "a") as fp:
+            fp.write("// customized\n")
+        for jobs in [1, 2]:
+            sys.stdout = io.StringIO()
+            list(vpm.list_corrupted(jobs=jobs, output="json"))
+            output, sys.stdout = sys.stdout.getvalue(), None
+            lines = sorted(output.splitlines())
+            assert [json.loads(line) for line in lines] == [{
+                "name": "adc_sar",
+                "version": "0.0.1",
+                "source": os.path.join(self.dir, "sar"),
+                "corrupted": False,
+                "files": {}
+            }, {
+                "name": "resync",
+                "version": "0.0.2",
+                "source": os.path.join(self.dir, "resync"),
+                "corrupted": True,
+                "files": {"designs": {"edge_resync.v": None}}
+            }]
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import os
+import sys
+import unittest
+
+vpm_module = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(vpm_module)
+
+import vpm
+
+
+def make_candidates(graph: dict):
+    # graph: name -> version -> dependencies
+    def candidates(name: str):
+        pkgs = []
+        for version, deps in graph.get(name, {}).items():
+            pkg = vpm.Package(name, version)
+            pkg.dependencies = [vpm.Package.parse_package_name(dep) for dep in deps]
+            pkgs.append((pkg, "%s-%s" % (name, version)))
+        return sorted(pkgs, key=lambda c: c[0].version, reverse=True)
+    return candidates
+
+
+def resolve(graph: dict, *names):
+    reqs = [vpm.Package.parse_package_name(name) for name in names]
+    return [src for pkg, src in vpm.resolve(reqs, make_candidates(graph))]
+
+
+class ResolverTests(unittest.TestCase):
+
+    def test_operators(self):
+        pkg = vpm.Package("a", "1.2.0")
+        assert vpm.satisfies(pkg, vpm.Package.parse_package_name("a"))
+        assert vpm.satisfies(pkg, vpm.Package.parse_package_name("a 1.0.0"))
+        assert vpm.satisfies(pkg, vpm.Package.parse_package_name("a >= 1.2.0"))
+        assert vpm.satisfies(pkg, vpm.Package.parse_package_name("a > 1.1.0"))
+        assert vpm.satisfies(pkg, vpm.Package.parse_package_name("a = 1.2.0"))
+        assert vpm.satisfies(pkg, vpm.Package.parse_package_name("a<2.0.0"))
+        assert vpm.satisfies(pkg, vpm.Package.parse_package_name("a <= 1.2.0"))
+        assert not vpm.satisfies(pkg, vpm.Package.parse_package_name("a < 1.2.0"))
+        assert not vpm.satisfies(pkg, vpm.Package.parse_package_name("a = 1.0.0"))
+        assert not vpm.satisfies(pkg, vpm.Package.parse_package_name("b"))
+        assert vpm.Package.parse_package_name("a <= 1.2.0").requirement() == "a <= 1.2.0"
+
+    def test_ranges(self):
+        rng = vpm.VersionRange.parse(">=1.2.0,<2.0.0")
+        assert "1.2.0" in rng and "1.10.0" in rng
+        assert "2.0.0" not in rng and "1.1.9" not in rng and "2.0.0-rc1" in rng
+        assert vpm.VersionRange.parse("").contains("0.0.1")
+        assert rng.intersection(vpm.VersionRange.parse("> 1.5.0")) == \
+            vpm.VersionRange.parse("> 1.5.0, < 2.0.0")
+        assert not rng.intersection(vpm.VersionRange.parse("<= 1.2.0")).is_empty()
+        assert rng.intersection(vpm.VersionRange.parse("< 1.2.0")).is_empty()
+        assert rng.intersection(vpm.VersionRange.parse("= 2.0.0")).is_empty()
+        with self.assertRaises(ValueError):
+            vpm.VersionRange.parse(">> 1.0.0")
+        for spec in ["a >= 1.2.0 < 2.0.0", "a >> 1.0", "a,", "a >= 1.0.0,", "", "  "]:
+            with self.assertRaises(ValueError) as ctx:
+                vpm.Package.parse_package_name(spec)
+            assert repr(spec) in str(ctx.exception)
+        # compound requirements
+        req = vpm.Package.parse_package_name("a >= 1.2.0, < 2.0.0")
+        assert req.requirement() == "a >= 1.2.0, < 2.0.0"
+        assert vpm.satisfies(vpm.Package("a", "1.5.0"), req)
+        assert not vpm.satisfies(vpm.Package("a", "2.0.0"), req)
+        # build metadata
+        req_build = vpm.Package.parse_package_name("a = 1.0.0+build")
+        assert req_build.requirement() == "a = 1.0.0+build"
+        # the operators are kept in a package.yml
+        pkg = vpm.Package("top", "1.0.0")
+        pkg.dependencies = [vpm.Package.parse_package_name("other < 2.0.0"), req]
+        assert pkg.to_dict()["dependencies"] == ["other < 2.0.0", "a >= 1.2.0, < 2.0.0"]
+        graph = {
+            "top": {"1.0.0": ["a >= 1.0.0, < 2.0.0"]},
+            "a": {"1.0.0": [], "1.5.0": [], "2.0.0": []},
+        }
+        assert resolve(graph, "top") == ["a-1.5.0", "top-1.0.0"]
+
+    def test_diamond(self):
+        graph = {
+            "top": {"1.0.0": ["left", "right"]},
+            "left": {"1.0.0": ["base >= 1.0.0"]},
+            "right": {"1.0.0": ["base < 2.0.0"]},
+            "base": {"1.0.0": [], "1.5.0": [], "2.0.0": []},
+        }
+        # each package once, dependencies first
+        assert resolve(graph, "top") == \
+            ["base-1.5.0", "left-1.0.0", "right-1.0.0", "top-1.0.0"]
+
+    def test_backtrack(self):
+        graph = {
+            "top": {"1.0.0": ["a", "b"]},
+            "a": {"2.0.0": ["c = 2.0.0"], "1.0.0": ["c = 1.0.0"]},
+            "b": {"1.0.0": ["c < 2.0.0"]},
+            "c": {"1.0.0": [], "2.0.0": []},
+        }
+        assert resolve(graph, "top") == ["c-1.0.0", "a-1.0.0", "b-1.0.0", "top-1.0.0"]
+
+    def test_cycle(self):
+        graph = {
+            "a": {"1.0.0": ["b"]},
+            "b": {"1.0.0": ["a = 1.0.0"]},
+        }
+        assert sorted(resolve(graph, "a")) == ["a-1.0.0", "b-1.0.0"]
+        # c is required by b once its position is passed
+        graph = {
+            "a": {"2.0.0": ["c"], "1.0.0": ["b"]},
+            "b": {"1.0.0": ["c"]},
+            "c": {"1.0.0": ["b"]},
+        }
+        plan = vpm.resolve([vpm.Package.parse_package_name("a < 2.0.0")],
+                           make_candidates(graph))
+        chosen = {pkg.name: pkg for pkg, _ in plan}
+        assert sorted(chosen) == ["a", "b", "c"]
+        for pkg, _ in plan:
+            for dep in pkg.dependencies:
+                assert vpm.satisfies(chosen[dep.name], dep)
+
+    def test_conflict(self):
+        graph = {
+            "top": {"1.0.0": ["a = 0.0.1", "b"]},
+            "a": {"0.0.1": [], "0.0.2": []},
+            "b": {"1.0.0": ["a >= 0.0.2"]},
+        }
+        with self.assertRaises(vpm.ResolutionError) as ctx:
+            resolve(graph, "top")
+        assert "no version of a" in str(ctx.exception)
+        with self.assertRaises(vpm.ResolutionError) as ctx:
+            resolve(graph, "missing")
+        assert str(ctx.exception) == "missing is not found"
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import io
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+from concurrent.futures import ProcessPoolExecutor
+
+vpm_module = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(vpm_module)
+
+import vpm
+
+
+def register(args):
+    # register a package in the platform of another process
+    path, name = args
+    os.chdir(path)
+    vpm.register_package(vpm.Package(name, "0.0.1"))
+    return name
+
+
+class SerializationTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tests_dir = os.path.dirname(os.path.abspath(__file__))
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        sys.stdout, sys.stderr = None, None
+        self.dir = tempfile.mkdtemp()
+        shutil.copy(os.path.join(self.tests_dir, "sar", "package.yml"), self.dir)
+
+    def tearDown(self):
+        sys.stdout = sys.__stdout__
+        sys.stderr = sys.__stderr__
+        shutil.rmtree(self.dir, ignore_errors=True)
+        os.environ.pop("VPM_CACHE_DIR", None)
+        os.chdir(self.cwd)
+
+    def test_cache_copy(self):
+        pkg = vpm.read_package(self.dir)
+        pkg.designs.append("foo.v")
+        pkg.dependencies.append(vpm.Package("foo", "0.1.0"))
+        pkg = vpm.read_package(self.dir)
+        assert len(pkg.designs) == 2
+        assert len(pkg.dependencies) == 1
+
+    def test_cache_invalidation(self):
+        pkg = vpm.read_package(self.dir)
+        pkg.version = vpm.Version("0.0.2")
+        vpm.write_package(pkg, self.dir)
+        assert vpm.read_package(self.dir).version == "0.0.2"
+        # same size, same mtime but modified outside of vpm
+        pkg_file = os.path.join(self.dir, "package.yml")
+        st = os.stat(pkg_file)
+        with open(pkg_file, "r") as fp:
+            content = fp.read()
+        with open(pkg_file, "w") as fp:
+            fp.write(content.replace("0.0.2", "0.0.3"))
+        os.utime(pkg_file, ns=(st.st_atime_ns, st.st_mtime_ns))
+        assert vpm.read_package(self.dir).version == "0.0.3"
+
+    def test_sidecar(self):
+        os.environ["VPM_CACHE_DIR"] = os.path.join(self.dir, "cache")
+        with open(os.path.join(self.dir, "vpm.config"), "w+") as fp:
+            fp.write("[cache]\nmanifests=yes\n")
+        os.chdir(self.dir)
+        # old enough to not be racy
+        pkg_file = os.path.join(self.dir, "package.yml")
+        os.utime(pkg_file, (0, 0))
+        vpm.read_package(self.dir)
+        sidecars = os.listdir(os.path.join(self.dir, "cache", "manifests"))
+        assert len(sidecars) == 1
+        # the json copy is used
+        sidecar = os.path.join(self.dir, "cache", "manifests", sidecars[0])
+        with open(sidecar, "r") as fp:
+            data = json.load(fp)
+        data["content"]["name"] = "from_sidecar"
+        with open(sidecar, "w") as fp:
+            json.dump(data, fp)
+        vpm.clear_package_cache()
+        assert vpm.read_package(self.dir).name == "from_sidecar"
+        # a newer yaml is parsed again
+        with open(pkg_file, "a") as fp:
+            fp.write("description: sidecar\n")
+        os.utime(pkg_file, (10, 10))
+        vpm.clear_package_cache()
+        assert vpm.read_package(self.dir).description == "sidecar"
+
+    def test_atomic_write(self):
+        pkg_file = os.path.join(self.dir, "package.yml")
+        with open(pkg_file, "r") as fp:
+            content = fp.read()
+        pkg = vpm.read_package(self.dir)
+        # interrupted while writing
+        pkg.designs = [object()]
+        with self.assertRaises(Exception):
+            vpm.write_package(pkg, self.dir)
+        with open(pkg_file, "r") as fp:
+            assert fp.read() == content
+        assert os.listdir(self.dir) == ["package.yml"]
+        # an error in a transaction writes nothing
+        with self.assertRaises(KeyError):
+            with vpm.package_transaction(self.dir) as pkg:
+                pkg.version = vpm.Version("0.1.0")
+                raise KeyError("interrupted")
+        assert vpm.read_package(self.dir).version == "0.0.1"
+        with vpm.package_transaction(self.dir) as pkg:
+            pkg.version = vpm.Version("0.1.0")
+            # the lock can be taken again by the same thread
+            with vpm.manifest_lock(self.dir):
+                pass
+        assert vpm.read_package(self.dir).version == "0.1.0"
+
+    def test_concurrent_register(self):
+        names = ["ip%d" % i for i in range(16)]
+        with ProcessPoolExecutor(max_workers=4) as executor:
+            list(executor.map(register, [(self.dir, name) for name in names]))
+        os.chdir(self.dir)
+        deps = [dep.name for dep in vpm.read_package().dependencies]
+        assert sorted(deps) == sorted(names + ["resync"])
+
+    def test_lock_warning(self):
+        with vpm.manifest_lock(self.dir):
+            assert os.path.exists(os.path.join(self.dir, vpm.PLATFORM_LOCK))
+        fcntl = vpm.serialization.fcntl
+
+        class NoLock(object):
+            LOCK_EX = 2
+
+            @staticmethod
+            def lockf(fd, op):
+                raise OSError("no locks available")
+
+        vpm.serialization.fcntl = NoLock
+        sys.stderr = io.StringIO()
+        try:
+            with vpm.package_transaction(self.dir):
+                pass
+            assert "no locks available" in sys.stderr.getvalue()
+        finally:
+            vpm.serialization.fcntl = fcntl
@@ -75,7 +75,8 @@ class PackageTests(unittest.TestCase):
         # a, b, m are latest versions
         assert self.a == self.b
         assert self.a == self.m
-        assert self.c >= self.d
+        assert not self.c >= self.d
+        assert self.d >= self.c
         assert self.a >= self.b
         assert self.c <= self.b
         assert not self.b <= self.c
@@ -103,7 +104,8 @@ class PackageTests(unittest.TestCase):
         assert self.g != 1.0
         assert self.e == 1.0
         assert self.e == 1
-        assert self.i <= self.g
+        assert not self.i <= self.g
+        assert self.g <= self.i
         assert self.e <= self.g
         assert not self.d < self.c
 
@@ -127,3 +129,25 @@ class PackageTests(unittest.TestCase):
         assert pkg_D >= pkg_C
         assert not pkg_D <= pkg_C
         assert pkg_D >= pkg_D
+
+    def test_hash(self):
+        # the same value is parsed once
+        assert vpm.Version("1.0.0") is vpm.Version("1.0.0")
+        assert vpm.Version(self.e) is self.e
+        with self.assertRaises(AttributeError):
+            self.e.major = 2
+        # equal versions have the same hash
+        assert len(set([self.a, self.b, self.m, self.c, self.e, vpm.Version(1.0)])) == 2
+        d = {vpm.Version("1.2"): "a"}
+        assert d[vpm.Version("1.2.0")] == "a"
+
+    def test_sort(self):
+        versions = ["1.0.0", "", "0.9.8", "1.0.0-rc1", "1.0.0-rc2", "1.10.0",
+                    "1.2.0", "dev", "1.0.0-alpha", "2.0.0", "1.0.1"]
+        assert [str(v) for v in sorted(vpm.Version(v) for v in versions)] == [
+            "dev", "0.9.8", "1.0.0-alpha", "1.0.0-rc1", "1.0.0-rc2", "1.0.0",
+            "1.0.1", "1.2.0", "1.10.0", "2.0.0", ""
+        ]
+        assert vpm.Version("1.0.0+build") == vpm.Version("1.0.0")
+        assert vpm.Version("1.0.0-rc1") < "1.0.0"
+        assert vpm.Version("1.0.0-rc1") > "0.9.9"
@@ -9,3 +9,7 @@ from .install import *
 from .default import *
 from .github import *
 from .serialization import *
+from .index import *
+from .resolver import *
+from .lock import *
+from .cache import *
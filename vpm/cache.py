@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import os
+import re
+import sys
+import time
+import threading
+import vpm
+
+# blobs of remote packages are immutable and stored by their git sha
+# the least recently used ones are evicted above the size limit
+
+# bytes stored in each blob cache, read once per process then tracked
+_CACHE_SIZE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def parse_size(value: str):
+    # 512, 100K, 20M, 1G, 1.5T
+    m = re.match(r"^\s*([\d\.]+)\s*([KMGT]?)i?B?\s*$", str(value), flags=re.IGNORECASE)
+    if not m:
+        return None
+    unit = " KMGT".index((m.group(2) or " ").upper())
+    return int(float(m.group(1)) * 1024 ** unit)
+
+
+def cache_limit():
+    return parse_size(vpm.config_value("cache", "size", "1G"))
+
+
+def blob_path(sha: str):
+    return vpm.cache_dir("blobs", sha[:2], sha)
+
+
+def cache_get(sha: str):
+    # path of the cached blob if any
+    if not sha:
+        return None
+    path = blob_path(sha)
+    try:
+        # mark it as recently used
+        os.utime(path, None)
+    except OSError:
+        return None
+    return path
+
+
+def cache_move(sha: str, filepath: str):
+    # move a file written next to the cache into it
+    path = blob_path(sha)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(filepath, path)
+    root = vpm.cache_dir("blobs")
+    with _CACHE_LOCK:
+        if root in _CACHE_SIZE:
+            _CACHE_SIZE[root] += os.path.getsize(path)
+    return path
+
+
+def cache_tmp_path(path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return "%s.%d.%d.tmp" % (path, os.getpid(), threading.get_ident())
+
+
+def cache_blobs():
+    # (path, size, last use) of each blob
+    root = vpm.cache_dir("blobs")
+    if not os.path.isdir(root):
+        return []
+    blobs = []
+    for prefix in os.scandir(root):
+        if not prefix.is_dir():
+            continue
+        for entry in os.scandir(prefix.path):
+            if entry.name.endswith(".tmp"):
+                continue
+            st = entry.stat()
+            blobs.append((entry.path, st.st_size, st.st_mtime))
+    return blobs
+
+
+def cache_stats(no_print: bool = False):
+    blobs = cache_blobs()
+    stats = {
+        "directory": vpm.cache_dir("blobs"),
+        "count": len(blobs),
+        "size": sum(b[1] for b in blobs),
+        "limit": cache_limit(),
+        "oldest": min([b[2] for b in blobs]) if blobs else None
+    }
+    if not no_print:
+        print("directory: %s" % stats["directory"])
+        print("blobs: %d" % stats["count"])
+        if stats["limit"] is None:
+            print("size: %d bytes, invalid [cache] size '%s'" % (
+                stats["size"], vpm.config_value("cache", "size")))
+        else:
+            print("size: %d / %d bytes" % (stats["size"], stats["limit"]))
+        if stats["oldest"]:
+            print("oldest use: %s" % time.ctime(stats["oldest"]))
+    return stats
+
+
+def cache_prune(limit: int = None, no_print: bool = True):
+    # evict the least recently used blobs above the limit
+    limit = cache_limit() if limit is None else limit
+    if limit is None:
+        print("invalid [cache] size '%s', the cache is not pruned" % (
+            vpm.config_value("cache", "size")), file=sys.stderr)
+        return 0
+    blobs = sorted(cache_blobs(), key=lambda b: b[2])
+    size = sum(b[1] for b in blobs)
+    removed = 0
+    for path, blob_size, _ in blobs:
+        # a limit of 0 empties the cache
+        if size <= limit and limit > 0:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        size -= blob_size
+        removed += 1
+    with _CACHE_LOCK:
+        _CACHE_SIZE[vpm.cache_dir("blobs")] = size
+    if not no_print:
+        print("%d blobs removed, %d bytes kept" % (removed, size))
+    return removed
+
+
+def cache_check():
+    """
+    prune the cache once above its size limit
+
+    the size of the cache is read by the first call in the process
+    and then tracked as blobs are stored, such that downloads do not
+    scan the whole cache each time
+    """
+    limit = cache_limit()
+    with _CACHE_LOCK:
+        size = _CACHE_SIZE.get(vpm.cache_dir("blobs"))
+    if limit is None or (size is not None and size <= limit):
+        return 0
+    return cache_prune(limit)
@@ -5,35 +5,37 @@ import re
 import vpm
 
 
-def is_package_installed(p: vpm.Package, path: str = None):
+def is_package_installed(p: vpm.Package, path: str = None, identical: bool = False):
     pkg = vpm.read_package(path)
     # check name
     if p.name == pkg.name:
-        return pkg >= p if p.version not in ('', None) else True
-    # check newer version of a package
-    # or same version is installed
+        if identical:
+            return pkg.version == p.version
+        return p.version_range().contains(pkg.version)
+    # check the installed version is in the range of p
     # if version is '' or None does not ensure latest but just have package name
     for dep in pkg.dependencies:
         if p.name == dep.name:
-            return dep >= p
+            # the very version of p is installed
+            if identical:
+                return dep.version == p.version
+            if p.version.value in ('', None):
+                return dep >= p
+            return p.version_range().contains(dep.version)
     return False
 
 
-def is_package(p: vpm.Package, path: str = None, identical: bool = False):
-    # create package file if none
-    pkg = vpm.read_package(path)
-    # check name
-    if p.name == pkg.name and identical:
-        return pkg == p
-    # if version is '' or None, the latest version match only the
-    # the package name find in repository
-    if p.name == pkg.name:
-        return pkg >= p if p.version not in ('', None) else True
-
-
 def is_git_path(path: str = ""):
     if not isinstance(path, str):
         return False
     regex = r"(\w+\/\w+)(?:\.git|\/tree):?\/?(\w+)?\/?([\w\/]+)?"
     m = re.search(regex, path)
     return m if m else False
+
+
+def git_path_args(path: str = ""):
+    # repository, branch and path of a git url
+    match = is_git_path(path)
+    if not match:
+        return []
+    return [g for g in match.groups() if g]
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # coding: utf-8
 
+import os
 import sys
 import vpm
 import argparse
@@ -13,36 +14,93 @@ def cli_args():
         "update": "update a package from its name",
         "list": "list all packages available/installed/outdated/corrupted",
         "remove": "remove a package",
-        "create": "package/config"
+        "create": "package/config",
+        "index": "build the index of the packages in the sources",
+        "cache": "stats/prune the cache of downloaded files"
     }
     # make sys args available
     arguments = ["--" + a if a in mangle_args.keys() else a for a in sys.argv[1:]]
     parser = argparse.ArgumentParser()
+    shorts = set()
     for a in mangle_args.keys():
+        # short option only for the first action with this letter
+        flags = ["--" + a] if a[0] in shorts else ["-" + a[0], "--" + a]
+        shorts.add(a[0])
+        # install takes several package names or none with --frozen
+        options = {"nargs": "*"} if a == "install" else {}
         parser.add_argument(
-            "-" + a[0], "--" + a, help=mangle_args[a], default=None, type=str
+            *flags, help=mangle_args[a], default=None, type=str, **options
         )
+    # options
+    parser.add_argument(
+        "--config", help="path of the vpm.config to use (or VPM_CONFIG)",
+        default=None, type=str
+    )
+    parser.add_argument(
+        "-R", "--requirements", help="install the packages listed in a file, one per line",
+        default=None, type=str
+    )
+    parser.add_argument(
+        "--frozen", help="install the packages pinned in vpm.lock",
+        default=False, action="store_true"
+    )
+    parser.add_argument(
+        "--diff", help="show the diff of the modified files of list corrupted",
+        default=False, action="store_true"
+    )
+    parser.add_argument(
+        "--jobs", help="number of packages verified concurrently by list corrupted",
+        default=None, type=int
+    )
+    parser.add_argument(
+        "--offline", help="only use the index and the cache (or VPM_OFFLINE=1)",
+        default=False, action="store_true"
+    )
+    parser.add_argument(
+        "--json", help="print one json object per line",
+        default=False, action="store_true"
+    )
     # return the parsed actions
     return (parser, parser.parse_args(arguments))
 
 
 def cli_main():
     parser, args = cli_args()
-    if args.install is not None:
-        vpm.install_package(args.install.lower())
+    if args.config is not None:
+        os.environ["VPM_CONFIG"] = os.path.abspath(args.config)
+    if args.offline:
+        os.environ["VPM_OFFLINE"] = "1"
+    try:
+        cli_run(parser, args)
+    except vpm.OfflineError as e:
+        print("offline: %s" % e, file=sys.stderr)
+        exit(1)
+    exit(0)
+
+
+def cli_run(parser, args):
+    if args.install is not None and args.frozen:
+        vpm.install_frozen()
+    elif args.install or args.requirements:
+        names = [name.lower() for name in args.install or []]
+        if args.requirements:
+            names.extend(name.lower() for name in vpm.read_requirements(args.requirements))
+        vpm.install_packages(names)
     elif args.update is not None:
         vpm.install_package(args.update.lower(), force=True)
     elif args.list is not None:
         if args.list.lower() == "installed":
-            vpm.list_installed()
+            list(vpm.list_installed())
         elif args.list.lower() == "outdated":
-            vpm.list_outdated()
+            list(vpm.list_outdated(output="json" if args.json else "text"))
         elif args.list.lower() == "available":
-            vpm.list_available()
+            list(vpm.list_available())
         elif args.list.lower() == "corrupted":
-            vpm.list_corrupted()
+            list(vpm.list_corrupted(
+                diff=args.diff, jobs=args.jobs, output="json" if args.json else "text"
+            ))
         elif args.list.lower() == "sources":
-            vpm.list_sources()
+            list(vpm.list_sources())
         else:
             print("unknown option", file=sys.stderr)
     elif args.create is not None:
@@ -54,11 +112,22 @@ def cli_main():
             print("unknown option", file=sys.stderr)
     elif args.remove is not None:
         vpm.remove_package(args.remove.lower())
+    elif args.cache is not None:
+        if args.cache.lower() == "stats":
+            vpm.cache_stats()
+        elif args.cache.lower() == "prune":
+            vpm.cache_prune(no_print=False)
+        else:
+            print("unknown option", file=sys.stderr)
+    elif args.index is not None:
+        if args.index.lower() == "build":
+            vpm.build_index(no_print=False)
+        else:
+            print("unknown option", file=sys.stderr)
     else:
         print("unknown actions", file=sys.stderr)
         parser.print_help()
         exit(1)
-    exit(0)
 
 
 if __name__ == "__main__":
@@ -5,24 +5,99 @@ import re
 import os
 import configparser
 
-from pathlib import Path
-
 DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "default.ini")
+CONFIG_NAME = "vpm.config"
+
+# parsed configurations of this process keyed by path
+# and invalidated when the (mtime, size) of the file changes
+_CONFIG_CACHE = {}
 
 
 def read_config(filepath: str):
     # parse the file
     config = configparser.ConfigParser(allow_no_value=True)
-    config.read([DEFAULT_CONFIG, filepath])
+    config.read([DEFAULT_CONFIG, filepath] if filepath else [DEFAULT_CONFIG])
     return config
 
 
-def find_config():
-    # find a vpm.config file in the current directory tree
-    cfgs = Path(os.getcwd()).glob("**/vpm.config")
-    for cfg in cfgs:
-        os.environ["PLATFORM"] = os.path.dirname(str(cfg))
-        return read_config(str(cfg))
+def find_config_path(start: str = None):
+    # an explicit configuration file prevails over the discovery
+    # VPM_CONFIG can either point to the file or to its directory
+    explicit = os.getenv("VPM_CONFIG")
+    if explicit:
+        if os.path.isdir(explicit):
+            explicit = os.path.join(explicit, CONFIG_NAME)
+        return os.path.abspath(explicit) if os.path.isfile(explicit) else None
+    # walk upward from the current directory as git does for .git
+    # up to the root or one of the VPM_CEILING_DIRECTORIES
+    ceilings = [
+        os.path.abspath(d)
+        for d in os.getenv("VPM_CEILING_DIRECTORIES", "").split(os.pathsep) if d
+    ]
+    current = os.path.abspath(start or os.getcwd())
+    while True:
+        cfg = os.path.join(current, CONFIG_NAME)
+        if os.path.isfile(cfg):
+            return cfg
+        parent = os.path.dirname(current)
+        if parent == current or current in ceilings:
+            return None
+        current = parent
+
+
+def find_config(start: str = None):
+    # find a vpm.config file in the current directory or its parents
+    cfg = find_config_path(start)
+    if cfg is None:
+        return None
+    os.environ["PLATFORM"] = os.path.dirname(cfg)
+    return _cached_config(cfg)
+
+
+def platform_dir():
+    # directory of the vpm.config found, else the current one, where the
+    # package.yml and vpm.lock are and relative sources start from
+    cfg = find_config_path()
+    return os.path.dirname(cfg) if cfg else os.getcwd()
+
+
+def _cached_config(cfg: str):
+    # parse it only once per process unless it changed
+    st = os.stat(cfg)
+    signature = (st.st_mtime_ns, st.st_size)
+    cached = _CONFIG_CACHE.get(cfg)
+    if cached is None or cached[0] != signature:
+        cached = (signature, read_config(None if cfg == DEFAULT_CONFIG else cfg))
+        _CONFIG_CACHE[cfg] = cached
+    return cached[1]
+
+
+def clear_config_cache():
+    _CONFIG_CACHE.clear()
+
+
+def config_value(section: str, key: str, fallback: str = None):
+    # value of the platform config if any else the default one
+    cfg = find_config() or _cached_config(DEFAULT_CONFIG)
+    if not cfg.has_option(section, key) or cfg[section].get(key) is None:
+        return fallback
+    return config_interp(cfg, section, key)
+
+
+def config_flag(section: str, key: str, fallback: bool = False):
+    value = config_value(section, key)
+    if value is None:
+        return fallback
+    return value.strip().lower() in ("1", "yes", "true", "on")
+
+
+def cache_dir(*parts):
+    # VPM_CACHE_DIR > [cache] directory > $XDG_CACHE_HOME/vpm > ~/.cache/vpm
+    root = os.getenv("VPM_CACHE_DIR") or config_value("cache", "directory")
+    if not root:
+        xdg = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        root = os.path.join(xdg, "vpm")
+    return os.path.join(root, *parts)
 
 
 def config_interp(cfg, section, key):
@@ -2,10 +2,11 @@
 # coding: utf-8
 
 import os
+import vpm
 
 
 def default_package():
-    CURRENT_FILE = os.path.join(os.getcwd(), "package.yml")
+    CURRENT_FILE = os.path.join(vpm.platform_dir(), "package.yml")
     if not os.path.exists(CURRENT_FILE):
         with open(CURRENT_FILE, "w+") as fp:
             fp.write('name: "basic_package"\n')
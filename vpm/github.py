@@ -4,11 +4,16 @@
 import os
 import sys
 import json
-import yaml
+import time
 import base64
-import tempfile
+import hashlib
+import threading
 
-from urllib.request import urlopen, Request
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+from urllib.error import HTTPError
+from shutil import copyfile
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
 
 vpm_module = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.append(vpm_module)
@@ -19,36 +24,288 @@ import vpm
 # 60 reqs/h if unauth and 5000 reqs/h if basic
 # For search api respectivly 10 and 30 reqs/min
 
+# api root, VPM_GITHUB_API allows to use a github enterprise or a mock
+GITHUB_API = "https://api.github.com"
 # user/repo or user/repo as username:password
-BASEURL = "https://api.github.com/repos/%s/git/trees/%s?recursive=1"
+BASEURL = "%s/repos/%s/git/trees/%s?recursive=1"
+
+# blobs are downloaded as raw bytes by chunks
+RAW_MEDIA_TYPE = "application/vnd.github.v3.raw"
+CHUNK_SIZE = 64 * 1024
 
 # basic auth is deprecated and will be removed
 VPM_GITHUB_TOKEN = os.getenv("VPM_GITHUB_TOKEN")
 
 
+class OfflineError(Exception):
+    # a file which is neither cached nor indexed while offline
+    pass
+
+
+def is_offline():
+    # VPM_OFFLINE=1 or vpm --offline: github is never requested
+    return os.getenv("VPM_OFFLINE", "").strip().lower() in ("1", "yes", "true", "on")
+
+
+class GithubSession(object):
+    """
+    keep-alive http connections to the github api
+
+    each thread has its own connection per host such that
+    concurrent downloads share neither sockets nor tls handshakes
+
+    when the rate limit is exhausted, requests wait until the reset
+    announced by the X-RateLimit-Reset header (at most max_wait seconds)
+
+    concurrent downloads run in a single pool of threads for the whole
+    session, so their connections are kept alive from one package
+    to the next
+    """
+    __slots__ = ["local", "lock", "reset", "timeout", "max_wait", "executor", "opened"]
+
+    def __init__(self, timeout: float = 30.0, max_wait: float = 60.0):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.reset = 0.0
+        self.timeout = timeout
+        self.max_wait = max_wait
+        self.executor = None
+        # connections of all the threads
+        self.opened = []
+
+    def pool(self, jobs: int):
+        # threads of the session, created by the first concurrent download
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=jobs)
+            return self.executor
+
+    def connection(self, scheme: str, netloc: str, renew: bool = False):
+        conns = getattr(self.local, "conns", None)
+        if conns is None:
+            conns = self.local.conns = {}
+        key = (scheme, netloc)
+        if renew and key in conns:
+            conns.pop(key).close()
+        if key not in conns:
+            cls = HTTPSConnection if scheme == "https" else HTTPConnection
+            conns[key] = cls(netloc, timeout=self.timeout)
+            with self.lock:
+                self.opened.append(conns[key])
+        return conns[key]
+
+    def close(self):
+        # stop the threads of the pool then close every connection
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        with self.lock:
+            opened, self.opened = self.opened, []
+        for conn in opened:
+            conn.close()
+        self.local.conns = {}
+
+    def wait_rate_limit(self):
+        with self.lock:
+            delay = self.reset - time.time()
+        if delay > 0:
+            if delay > self.max_wait:
+                raise HTTPError(
+                    GITHUB_API, 403,
+                    "rate limit exceeded until %s" % time.ctime(self.reset), None, None
+                )
+            time.sleep(delay)
+
+    def update_rate_limit(self, res):
+        # remember when requests can be sent again
+        headers = res.headers
+        reset = None
+        if headers.get("Retry-After"):
+            reset = time.time() + float(headers.get("Retry-After"))
+        elif headers.get("X-RateLimit-Remaining") == "0" and \
+                headers.get("X-RateLimit-Reset"):
+            reset = float(headers.get("X-RateLimit-Reset"))
+        if reset is not None:
+            with self.lock:
+                self.reset = max(self.reset, reset)
+        return reset is not None
+
+    def request(self, url: str, headers: dict = {}):
+        # send a GET request and return the response
+        # with its body still to be read
+        if is_offline():
+            raise OfflineError("%s cannot be requested offline" % url)
+        parts = urlsplit(url)
+        target = parts.path + ("?" + parts.query if parts.query else "")
+        headers = dict(headers)
+        if VPM_GITHUB_TOKEN:
+            headers.setdefault("Authorization", "token %s" % VPM_GITHUB_TOKEN)
+        headers.setdefault("User-Agent", "vpm")
+        error = None
+        for attempt in range(3):
+            self.wait_rate_limit()
+            conn = self.connection(parts.scheme, parts.netloc, renew=attempt > 0)
+            try:
+                conn.request("GET", target, headers=headers)
+                res = conn.getresponse()
+            except (HTTPException, ConnectionError) as e:
+                # the server closed the kept alive connection
+                error = repr(e)
+                continue
+            limited = self.update_rate_limit(res)
+            if res.status in (403, 429) and limited:
+                body = res.read().decode("utf-8", "replace")
+                error = "rate limited (%d %s)" % (res.status, body)
+                continue
+            if res.status >= 400:
+                body = res.read()
+                raise HTTPError(url, res.status, body.decode("utf-8", "replace"),
+                                res.headers, None)
+            return res
+        raise HTTPError(url, 503, "too many retries, last error: %s" % error, None, None)
+
+
+_SESSION = None
+# trees already fetched during this run
+_TREES = {}
+
+
+def github_session():
+    global _SESSION
+    if _SESSION is None:
+        _SESSION = GithubSession(
+            timeout=float(vpm.config_value("github", "timeout", "30")),
+            max_wait=float(vpm.config_value("github", "max_wait", "60"))
+        )
+    return _SESSION
+
+
+def reset_github_session():
+    # forked processes must not share the connections of their parent
+    global _SESSION
+    _SESSION = None
+
+
+def github_api():
+    return os.getenv("VPM_GITHUB_API", GITHUB_API).rstrip("/")
+
+
+def github_jobs():
+    return max(1, int(vpm.config_value("github", "jobs", "8")))
+
+
 def github_request(url: str):
-    req = Request(url)
-    req.add_header("Authorization", "token %s" % VPM_GITHUB_TOKEN)
-    res = urlopen(req)
-    return json.loads(res.read().decode(res.headers.get_content_charset()))
+    res = github_session().request(url, {"Accept": "application/vnd.github.v3+json"})
+    charset = res.headers.get_content_charset() or "utf-8"
+    return json.loads(res.read().decode(charset))
+
+
+class RemoteFile(str):
+    """
+    path of a file in a github tree
+
+    the tree entry (sha, url, size) is known but the content
+    is only downloaded, into the blob cache, when local_path is called
+    """
+
+    def __new__(cls, path: str, entry: dict = None):
+        obj = str.__new__(cls, path)
+        obj.entry = entry or {}
+        return obj
+
+    def local_path(self):
+        return github_fetch(self.entry)
+
+
+def github_fetch(file: dict):
+    # path of the blob in the cache, downloaded if needed
+    sha = file.get("sha")
+    cached = vpm.cache_get(sha)
+    if cached:
+        return cached
+    if is_offline():
+        raise OfflineError("%s (blob %s) is not in the cache" % (
+            file.get("path") or file.get("url"), sha))
+    # raw bytes are streamed to disk and checked against the blob sha
+    res = github_session().request(file.get("url"), {"Accept": RAW_MEDIA_TYPE})
+    # without sha, the blob is cached by the sha of what was downloaded
+    tmp = vpm.cache_tmp_path(vpm.blob_path(sha) if sha else vpm.cache_dir("blobs", "fetch"))
+    try:
+        digest = github_stream(res, tmp, file.get("size"))
+        if sha and digest != sha:
+            raise IOError("corrupted download of %s: sha %s instead of %s" % (
+                file.get("path"), digest, sha))
+        path = vpm.cache_move(digest, tmp)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
 
+def github_stream(res, filepath: str, size: int = None):
+    # write the body of the response by chunks and return its git sha
+    if "json" in (res.headers.get("Content-Type") or ""):
+        # server ignoring the raw media type
+        data = json.loads(res.read().decode(res.headers.get_content_charset() or "utf-8"))
+        chunks = iter([base64.b64decode(data.get("content") or "")])
+        size = None
+    else:
+        chunks = iter(lambda: res.read(CHUNK_SIZE), b"")
+    digest = hashlib.sha1()
+    if size is not None:
+        digest.update(("blob %d\0" % size).encode("utf-8"))
+    with open(filepath, "wb") as fp:
+        for chunk in chunks:
+            if size is not None:
+                digest.update(chunk)
+            fp.write(chunk)
+    if size is not None:
+        return digest.hexdigest()
+    # size unknown beforehand: hash the written file
+    digest.update(("blob %d\0" % os.path.getsize(filepath)).encode("utf-8"))
+    with open(filepath, "rb") as fp:
+        for chunk in iter(lambda: fp.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-def github_content(path: str):
-    res = github_request(path)
-    encoding = res.get("encoding")
-    if encoding == "base64":
-        return base64.b64decode(res.get("content")).decode("utf-8")
-    print("unknown encoding %s" % encoding, file=sys.stderr)
-    return ""
 
+def github_fetch_all(files: list, jobs: int = None):
+    # fetch the files concurrently keeping their order
+    jobs = jobs or github_jobs()
+    missing = [f for f in files if not vpm.cache_get(f.get("sha"))]
+    if len(missing) < 2 or jobs == 1:
+        paths = [github_fetch(f) for f in files]
+    else:
+        paths = list(github_session().pool(jobs).map(github_fetch, files))
+    # keep the cache under its size limit
+    if missing:
+        vpm.cache_check()
+    return paths
 
-def github_download(file: dict, dir: str):
-    filename = os.path.basename(file.get("path"))
-    url = file.get("url")
-    filepath = os.path.join(dir, filename)
-    with open(filepath, "w+") as fp:
-        fp.write(github_content(url))
-    return filepath
+
+def github_prefetch(pkg):
+    # download at once all remote files of a package
+    files = [
+        f.entry for attr in vpm.Package.CATEGORIES
+        for f in getattr(pkg, attr) or [] if isinstance(f, RemoteFile)
+    ]
+    return github_fetch_all(files)
+
+
+def github_blob(file: dict):
+    # content of a file, from the cache when possible
+    with open(github_fetch(file), "r") as fp:
+        return fp.read()
+
+
+def github_download_all(files: list, dir: str, jobs: int = None):
+    # download the files concurrently keeping their order
+    paths = []
+    for file, path in zip(files, github_fetch_all(files, jobs)):
+        paths.append(os.path.join(dir, os.path.basename(file.get("path"))))
+        copyfile(path, paths[-1])
+    return paths
 
 
 def github_findfiles(tree: list = [], path: str = ""):
@@ -64,28 +321,74 @@ def github_findfile(tree: list = [], path: str = ""):
     return {}
 
 
+def github_tree(repository: str, branch: str = "master"):
+    # recursive listing of a branch fetched once per process
+    # and revalidated with its etag as 304 are not rate limited
+    url = BASEURL % (github_api(), repository, branch)
+    if url in _TREES:
+        return _TREES[url]
+    path = vpm.cache_dir("trees", "%s.json" % hashlib.sha1(url.encode("utf-8")).hexdigest())
+    cached = None
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as fp:
+                cached = json.load(fp)
+        except (OSError, ValueError):
+            cached = None
+    # the cached tree is used as is offline
+    if is_offline():
+        if not cached:
+            raise OfflineError("the tree of %s@%s is not in the cache" % (
+                repository, branch))
+        _TREES[url] = cached.get("body")
+        return _TREES[url]
+    headers = {"Accept": "application/vnd.github.v3+json"}
+    if cached and cached.get("etag"):
+        headers["If-None-Match"] = cached.get("etag")
+    res = github_session().request(url, headers)
+    body = res.read()
+    if res.status == 304 and cached:
+        tree = cached.get("body")
+    else:
+        tree = json.loads(body.decode(res.headers.get_content_charset() or "utf-8"))
+        if res.headers.get("ETag"):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = vpm.cache_tmp_path(path)
+            with open(tmp, "w+") as fp:
+                json.dump({"etag": res.headers.get("ETag"), "body": tree}, fp)
+            os.replace(tmp, path)
+    _TREES[url] = tree
+    return tree
+
+
+def clear_tree_cache():
+    _TREES.clear()
+
+
+def github_read_manifests(repository: str, branch: str = "master", path: str = "",
+                          res: dict = None):
+    # only download the package.yml found in the tree
+    if res is None:
+        res = github_tree(repository, branch)
+    for yml in github_findfiles(res.get("tree", []), "%s/package.yml" % path):
+        yield yml, vpm.yaml_load(github_blob(yml))
+
+
 def github_read_packages(repository: str, branch: str = "master", path: str = ""):
-    res = github_request(BASEURL % (repository, branch))
+    res = github_tree(repository, branch)
     tree = res.get("tree", [])
-    for yml in github_findfiles(tree, "%s/package.yml" % path):
+    by_path = {file.get("path"): file for file in tree}
+    for yml, d in github_read_manifests(repository, branch, path, res):
         url = yml.get("url")
         base_path = os.path.dirname(yml.get("path"))
-        content = github_content(url)
         print(yml.get("path"), url)
-        # parse to dict
-        d = yaml.load(content, Loader=yaml.FullLoader)
-        # make temporary directory
-        dir = tempfile.mkdtemp()
-        # download all files
-        for attr in vpm.Package.__slots__:
-            if attr in ["name", "version", "description", "dependencies"]:
-                continue
+        # files are only described by their tree entry
+        for attr in vpm.Package.CATEGORIES:
             if attr not in d.keys():
                 continue
             df = d.get(attr) or []
             files = [os.path.normpath(os.path.join(base_path, f)) for f in df]
-            files = [github_findfile(tree, f) for f in files]
-            d[attr] = [github_download(f, dir) for f in files if f]
-        # generate a new yml pointing to tmp file
+            files = [by_path.get(f) or github_findfile(tree, f) for f in files]
+            d[attr] = [RemoteFile(f.get("path"), f) for f in files if f]
         d["depth"] = len(yml.get("path", "").split('/'))
-        yield vpm.read_package(path=yml.get("path"), content=d)
+        yield vpm.Package.from_dict(d)
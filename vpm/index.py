@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import os
+import sys
+import json
+import time
+import queue
+import hashlib
+import threading
+import vpm
+
+INDEX_VERSION = 2
+
+# index of the process
+_INDEX = {}
+
+
+def index_path():
+    # one index per platform stored in the cache directory
+    cfg = vpm.find_config_path()
+    if cfg is None:
+        return None
+    digest = hashlib.sha1(cfg.encode("utf-8")).hexdigest()
+    return vpm.cache_dir("index", "%s.json" % digest)
+
+
+def read_index(path: str = None):
+    path = path or index_path()
+    if path and os.path.exists(path):
+        try:
+            with open(path, "r") as fp:
+                index = json.load(fp)
+            if index.get("version") == INDEX_VERSION:
+                return index
+        except (OSError, ValueError, AttributeError):
+            pass
+    return {"version": INDEX_VERSION, "sources": {}, "packages": {}}
+
+
+def write_index(index: dict, path: str = None):
+    path = path or index_path()
+    if path is None:
+        return None
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmp, "w+") as fp:
+        json.dump(index, fp, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+    return path
+
+
+def source_key(src: str):
+    # local sources are relative to the directory of the platform
+    if vpm.is_git_path(src):
+        return src
+    return os.path.abspath(os.path.join(vpm.platform_dir(), src))
+
+
+def source_signature(src: str):
+    # tree sha of the branch for git sources
+    if vpm.is_git_path(src):
+        return vpm.github_tree(*vpm.git_path_args(src)[:2]).get("sha")
+    # (mtime, size) of the package.yml for local ones
+    pkg_file = vpm.get_package_path(source_key(src))
+    if not os.path.isfile(pkg_file):
+        return None
+    st = os.stat(pkg_file)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def index_source(src: str, signature=None):
+    entry = {"signature": signature, "racy": False, "packages": []}
+    if vpm.is_git_path(src):
+        # as get_git_package only the first package of the tree is used
+        for yml, d in vpm.github_read_manifests(*vpm.git_path_args(src)):
+            pkg = vpm.Package.from_dict(d)
+            entry["packages"].append({
+                "name": pkg.name,
+                "version": _version_value(pkg.version),
+                "path": src,
+                "commit": signature,
+                "checksum": yml.get("sha"),
+                "dependencies": _dependencies_value(pkg),
+            })
+            break
+        return entry
+    pkg_file = vpm.get_package_path(source_key(src))
+    if signature is None:
+        return entry
+    with open(pkg_file, "rb") as fp:
+        checksum = hashlib.sha256(fp.read()).hexdigest()
+    pkg = vpm.read_package(pkg_file)
+    entry["racy"] = time.time() - signature[0] / 1e9 < vpm.RACY_DELAY
+    entry["packages"].append({
+        "name": pkg.name,
+        "version": _version_value(pkg.version),
+        "path": source_key(src),
+        "commit": None,
+        "checksum": checksum,
+        "dependencies": _dependencies_value(pkg),
+    })
+    return entry
+
+
+def index_jobs():
+    return max(1, int(vpm.config_value("index", "jobs", "16")))
+
+
+def index_timeout():
+    return float(vpm.config_value("index", "timeout", "60"))
+
+
+def scan_source(src: str, entry: dict = None, force: bool = False):
+    # (entry, changed) of a source, read again if its signature changed
+    if entry is not None and vpm.is_git_path(src) and vpm.is_offline():
+        # cannot be checked, the index is trusted
+        return entry, False
+    signature = source_signature(src)
+    if force or entry is None or entry.get("racy") or entry.get("signature") != signature:
+        return index_source(src, signature), True
+    return entry, False
+
+
+def scan_sources(srcs: list, previous: dict = {}, force: bool = False,
+                 jobs: int = None, timeout: float = None):
+    """
+    scan the sources concurrently and yield (src, entry, changed, error)
+    in the order the scans end
+
+    each source is given timeout seconds from the start of its scan,
+    a source failing or too slow is yielded with its error and None
+    as entry while the other sources are still scanned. a scan which
+    timed out cannot be interrupted: it is left to end on a daemon
+    thread, which does not keep the interpreter alive, and another
+    thread scans the sources left
+    """
+    jobs = jobs or index_jobs()
+    timeout = index_timeout() if timeout is None else timeout
+    if not srcs:
+        return
+    tasks, results, started = queue.Queue(), queue.Queue(), {}
+    for task in enumerate(srcs):
+        tasks.put(task)
+    scan = (tasks, results, started, previous, force)
+    for _ in range(min(jobs, len(srcs))):
+        _start_scan(*scan)
+    pending = dict(enumerate(srcs))
+    try:
+        while pending:
+            try:
+                i, outcome = results.get(timeout=_next_deadline(pending, started, timeout))
+            except queue.Empty:
+                pass
+            else:
+                # the result of a scan which timed out is dropped
+                if i in pending:
+                    yield (pending.pop(i),) + outcome
+            for i in _timed_out(pending, started, timeout):
+                error = TimeoutError("no answer within %g seconds" % timeout)
+                yield pending.pop(i), None, False, error
+                # the thread stuck in the scan is replaced
+                if not tasks.empty():
+                    _start_scan(*scan)
+    finally:
+        # the sources not started are not scanned
+        while not tasks.empty():
+            try:
+                tasks.get_nowait()
+            except queue.Empty:
+                break
+
+
+def _scan_worker(tasks, results, started, previous, force):
+    # scan the sources left until none is
+    while True:
+        try:
+            i, src = tasks.get_nowait()
+        except queue.Empty:
+            return
+        started[i] = time.time()
+        try:
+            entry, changed = scan_source(src, previous.get(source_key(src)), force)
+        except Exception as e:
+            results.put((i, (None, False, e)))
+        else:
+            results.put((i, (entry, changed, None)))
+
+
+def _start_scan(*scan):
+    # a daemon thread does not keep the interpreter alive
+    thread = threading.Thread(target=_scan_worker, args=scan, name="vpm-scan")
+    thread.daemon = True
+    thread.start()
+
+
+def _next_deadline(pending: dict, started: dict, timeout: float):
+    # delay to the earliest deadline, scans not started yet end
+    # at least timeout seconds from now
+    if timeout <= 0:
+        return None
+    now = time.time()
+    deadlines = [started[i] + timeout for i in pending if i in started]
+    return max(0.0, min(deadlines + [now + timeout]) - now)
+
+
+def _timed_out(pending: dict, started: dict, timeout: float):
+    # positions of the scans running for timeout seconds
+    if timeout <= 0:
+        return []
+    now = time.time()
+    return [i for i in sorted(pending) if i in started and now - started[i] >= timeout]
+
+
+def refresh_index(force: bool = False, no_print: bool = True):
+    """
+    refresh the index and yield (key, entry) of each source in the
+    order of the sources, as soon as it and the ones before it are
+    scanned. the index is stored once all the sources are
+    """
+    # refresh only the sources whose signature changed
+    path = index_path()
+    index = read_index(path)
+    srcs = list(vpm.list_sources(no_print=True))
+    keys = [source_key(src) for src in srcs]
+    # in the order of the sources whatever the order of the scans
+    scanned, sources, changed, k = {}, {}, force, 0
+    for src, entry, src_changed, error in scan_sources(srcs, index["sources"], force):
+        key = source_key(src)
+        if error is not None:
+            print("source %s skipped: %s" % (src, error), file=sys.stderr)
+            # keep what was known of it, to be read again next time
+            entry = index["sources"].get(key)
+            if entry is not None:
+                entry, src_changed = dict(entry, racy=True), True
+        elif src_changed and not no_print:
+            print("indexed %s" % src)
+        scanned[key] = entry
+        changed = changed or src_changed
+        while k < len(keys) and keys[k] in scanned:
+            key = keys[k]
+            k += 1
+            if scanned[key] is None or key in sources:
+                continue
+            sources[key] = scanned[key]
+            yield key, sources[key]
+    # sources added or removed, the index being written with sorted keys
+    changed = changed or set(sources) != set(index["sources"])
+    # name -> version -> entries in the order of the sources
+    packages, by_name = {}, {}
+    for entry in sources.values():
+        for pkg in entry["packages"]:
+            versions = packages.setdefault(pkg["name"], {})
+            versions.setdefault(str(pkg["version"]), []).append(pkg)
+            by_name.setdefault(pkg["name"], []).append(pkg)
+    index = {"version": INDEX_VERSION, "sources": sources, "packages": packages}
+    if changed:
+        write_index(index, path)
+    _INDEX[path] = (index, by_name)
+    if not no_print:
+        print("%d packages in %d sources" % (len(packages), len(sources)))
+
+
+def build_index(force: bool = False, no_print: bool = True):
+    for _ in refresh_index(force, no_print):
+        pass
+    return _INDEX[index_path()][0]
+
+
+def load_index():
+    # the index is refreshed once per process
+    path = index_path()
+    if path not in _INDEX:
+        build_index()
+    return _INDEX[path]
+
+
+def clear_index_cache():
+    _INDEX.clear()
+    vpm.clear_tree_cache()
+
+
+def index_entries(name: str = None):
+    # entries of a package name (all if None) in the order of the sources
+    index, by_name = load_index()
+    if name is None:
+        return [pkg for entry in index["sources"].values() for pkg in entry["packages"]]
+    return by_name.get(name, [])
+
+
+def stream_entries():
+    # entries of all the packages in the order of the sources, yielded
+    # while the sources are scanned if the index is not loaded yet
+    path = index_path()
+    if path in _INDEX:
+        sources = _INDEX[path][0]["sources"].items()
+    else:
+        sources = refresh_index()
+    for _, entry in sources:
+        for pkg in entry["packages"]:
+            yield pkg
+
+
+def find_sources(p: vpm.Package, identical: bool = False):
+    # sources providing a version of p in its range, or p itself
+    srcs = []
+    for entry in index_entries(p.name):
+        pkg = vpm.Package(entry["name"], entry["version"])
+        if identical:
+            ok = pkg == p
+        else:
+            ok = vpm.satisfies(pkg, p)
+        if ok and entry["path"] not in srcs:
+            srcs.append(entry["path"])
+    return srcs
+
+
+def _version_value(version: vpm.Version):
+    return None if version.value is None else str(version)
+
+
+def _dependencies_value(pkg: vpm.Package):
+    return [dep.requirement() for dep in pkg.dependencies if dep]
@@ -4,7 +4,14 @@
 import os
 import vpm
 
-from shutil import copyfile
+from shutil import copyfile, rmtree
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:
+    # not available on windows
+    fcntl = None
 
 
 PACKAGE_DIRS = {
@@ -17,25 +24,32 @@ PACKAGE_DIRS = {
     "testcases": "TESTCASES_DIR",
 }
 
+INSTALL_MODES = ["copy", "hardlink", "reflink", "symlink"]
+# ioctl cloning a file on btrfs, xfs, ...
+FICLONE = 0x40049409
+
 
 def register_package(p: vpm.Package):
-    pkg = vpm.read_package()
-    # add dependencies
-    pkg.dependencies.append(p)
-    # clean deps
-    pkg.uniquify_dependencies()
-    # update the db
-    vpm.write_package(pkg)
+    register_packages([p])
+
+
+def register_packages(pkgs: list):
+    # a single read and write of the package.yml
+    with vpm.package_transaction() as pkg:
+        # add dependencies, replacing the versions previously installed
+        names = set(p.name for p in pkgs)
+        pkg.dependencies = [dep for dep in pkg.dependencies if dep.name not in names]
+        pkg.dependencies.extend(pkgs)
+        # clean deps
+        pkg.uniquify_dependencies()
 
 
 def unregister_package(p):
-    pkg = vpm.read_package()
-    # remove the package p from pkg
-    pkg.dependencies = [dep for dep in pkg.dependencies if not dep.name == p.name]
-    # clean deps
-    pkg.uniquify_dependencies()
-    # update the db
-    vpm.write_package(pkg)
+    with vpm.package_transaction() as pkg:
+        # remove the package p from pkg
+        pkg.dependencies = [dep for dep in pkg.dependencies if not dep.name == p.name]
+        # clean deps
+        pkg.uniquify_dependencies()
 
 
 def retrieve_files(pkg_name: str = None):
@@ -44,38 +58,242 @@ def retrieve_files(pkg_name: str = None):
     # read the package
     pkg = vpm.Package(pkg_name)
     # find files
-    for attr in vpm.Package.__slots__:
+    for attr in vpm.Package.CATEGORIES:
         if attr not in PACKAGE_DIRS:
             continue
         cfg_dir = vpm.config_interp(cfg, "default", PACKAGE_DIRS[attr])
-        DEST_DIR = os.path.join(os.getcwd(), cfg_dir, pkg_name)
+        DEST_DIR = os.path.join(vpm.platform_dir(), cfg_dir, pkg_name)
         if os.path.exists(DEST_DIR):
             setattr(pkg, attr, [os.path.join(DEST_DIR, f) for f in os.listdir(DEST_DIR)])
     # return the version of the package installed
     return pkg
 
 
-def dispatch_files(path: str = None):
-    if path is None or (not vpm.is_git_path(path) and not os.path.exists(path)):
-        return None
-    # read the config
+def package_destinations(pkg: vpm.Package):
+    # (file, destination) of each file of the package
     cfg = vpm.find_config()
-    # read the package file
-    pkg = vpm.read_package(path)
-    # dispath files
-    for attr in vpm.Package.__slots__:
+    for attr in vpm.Package.CATEGORIES:
         items = getattr(pkg, attr)
         if items and attr in PACKAGE_DIRS:
             cfg_dir = vpm.config_interp(cfg, "default", PACKAGE_DIRS[attr])
-            DEST_DIR = os.path.join(os.getcwd(), cfg_dir, pkg.name)
-            os.makedirs(DEST_DIR, exist_ok=True)
+            DEST_DIR = os.path.join(vpm.platform_dir(), cfg_dir, pkg.name)
             for file in items:
-                copyfile(
-                    file,
-                    os.path.join(DEST_DIR, os.path.basename(file))
-                )
+                yield file, os.path.join(DEST_DIR, os.path.basename(file))
+
+
+def install_mode():
+    mode = (vpm.config_value("install", "mode", "copy") or "copy").strip().lower()
+    if mode not in INSTALL_MODES:
+        print("unknown install mode %s, files are copied" % mode)
+        return "copy"
+    return mode
+
+
+def install_jobs():
+    return max(1, int(vpm.config_value("install", "jobs", "8")))
+
+
+def reflink(src: str, dest: str):
+    # copy-on-write clone of src, False if not supported
+    if fcntl is None:
+        return False
+    with open(src, "rb") as fsrc, open(dest, "wb") as fdest:
+        try:
+            fcntl.ioctl(fdest.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            return False
+    return True
+
+
+def install_file(src: str, dest: str, mode: str = "copy"):
+    # never write through a link to the source of a previous install
+    if os.path.lexists(dest):
+        os.remove(dest)
+    if mode == "symlink":
+        os.symlink(os.path.abspath(src), dest)
+        return mode
+    if mode == "hardlink":
+        try:
+            os.link(src, dest)
+            return mode
+        except OSError:
+            # other filesystem or not supported
+            pass
+    if mode != "reflink" or not reflink(src, dest):
+        copyfile(src, dest)
+        mode = "copy"
+    # keep the modification time to detect unchanged files
+    st = os.stat(src)
+    os.utime(dest, ns=(st.st_atime_ns, st.st_mtime_ns))
+    return mode
+
+
+def is_file_installed(src: str, dest: str, mode: str = "copy"):
+    # dest already holds src as installed by the mode
+    try:
+        st_dest = os.lstat(dest)
+    except OSError:
+        return False
+    if mode == "symlink":
+        return os.path.islink(dest) and os.readlink(dest) == os.path.abspath(src)
+    if os.path.islink(dest):
+        return False
+    st_src = os.stat(src)
+    if (st_dest.st_dev, st_dest.st_ino) == (st_src.st_dev, st_src.st_ino):
+        # copies must not share the inode of the source
+        return mode == "hardlink"
+    if mode == "hardlink" and st_dest.st_dev == st_src.st_dev:
+        # could be linked
+        return False
+    if st_dest.st_size != st_src.st_size:
+        return False
+    if st_dest.st_mtime_ns == st_src.st_mtime_ns:
+        return True
+    # touched but maybe not modified
+    if vpm.file_sha256(src) != vpm.file_sha256(dest):
+        return False
+    os.utime(dest, ns=(st_src.st_atime_ns, st_src.st_mtime_ns))
+    return True
+
+
+def install_files(files: list, mode: str = None, jobs: int = None, staging: dict = None):
+    """
+    install concurrently the files, a list of (file, destination)
+
+    files already installed are skipped. return, for each file, the
+    mode used to install it or None if skipped. with staging, a map of
+    directory to staging directory, the files are installed in the
+    staging directory of their destination, see commit_files
+    """
+    mode = mode or install_mode()
+    jobs = jobs or install_jobs()
+
+    def install(item):
+        file, dest = item
+        # downloaded files are in the cache which is pruned or shared
+        remote = hasattr(file, "local_path")
+        file_mode = "copy" if remote and mode != "reflink" else mode
+        src = vpm.local_path(file)
+        if is_file_installed(src, dest, file_mode):
+            return None
+        return install_file(src, staged_path(dest, staging), file_mode)
+
+    for dest in set(os.path.dirname(staged_path(dest, staging)) for _, dest in files):
+        os.makedirs(dest, exist_ok=True)
+    if len(files) < 2 or jobs == 1:
+        return [install(item) for item in files]
+    with ThreadPoolExecutor(max_workers=min(jobs, len(files))) as executor:
+        return list(executor.map(install, files))
+
+
+def remove_stale_files(pkg: vpm.Package, files: list):
+    # files of the previous install of pkg no longer part of it
+    locked = vpm.read_lock()["packages"].get(pkg.name) or {}
+    dests = set(dest for _, dest in files)
+    removed = 0
+    for rel in locked.get("files") or {}:
+        dest = os.path.join(vpm.platform_dir(), rel)
+        if dest in dests or not os.path.lexists(dest):
+            continue
+        os.remove(dest)
+        removed += 1
+        # remove the folder once empty
+        try:
+            os.rmdir(os.path.dirname(dest))
+        except OSError:
+            pass
+    return removed
+
+
+def staging_path(directory: str):
+    name = ".%s.staging" % os.path.basename(directory)
+    return os.path.join(os.path.dirname(directory), name)
+
+
+def staged_path(dest: str, staging: dict = None):
+    # where dest is installed before being moved in place
+    directory = os.path.dirname(dest)
+    if not staging or directory not in staging:
+        return dest
+    return os.path.join(staging[directory], os.path.basename(dest))
+
+
+def stage_directory(directory: str):
+    # empty staging directory of directory, what an interrupted
+    # install left there is discarded
+    staging = staging_path(directory)
+    if os.path.lexists(staging):
+        rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    return staging
+
+
+def commit_files(files: list, modes: list, staging: dict):
+    # move in place the files installed in their staging directory
+    for (_, dest), mode in zip(files, modes):
+        if mode is None:
+            continue
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(staged_path(dest, staging), dest)
+
+
+def dispatch_files(path: str = None):
+    pkgs = dispatch_packages([path])
     # return the version of the package installed
-    return pkg
+    return pkgs[0]
+
+
+def dispatch_packages(paths: list):
+    """
+    install the files of the packages of paths at once
+
+    the files of all the packages are installed concurrently, as they
+    are placed in a directory per package. the modified files are first
+    installed in staging directories and only renamed over the installed
+    ones once all are ready, such that a failure while downloading or
+    copying leaves the previous install intact. the renames are not
+    atomic as a whole, and the platform is locked meanwhile. return the
+    package read from each path or None if the path does not exist
+    """
+    pkgs = []
+    for path in paths:
+        if path is None or (not vpm.is_git_path(path) and not os.path.exists(path)):
+            pkgs.append(None)
+            continue
+        # read the package file
+        pkg = vpm.read_package(path)
+        # download the remote files at once
+        vpm.github_prefetch(pkg)
+        pkgs.append(pkg)
+    # the files of the platform are installed by a process at a time
+    with vpm.manifest_lock():
+        files = [list(package_destinations(pkg)) if pkg else [] for pkg in pkgs]
+        items = [item for pkg_items in files for item in pkg_items]
+        # install in a staging directory next to each directory of the packages
+        staging = {}
+        for _, dest in items:
+            directory = os.path.dirname(dest)
+            if directory not in staging:
+                staging[directory] = stage_directory(directory)
+        try:
+            # dispath only the modified files
+            modes = install_files(items, staging=staging)
+            # all are ready: move them in place
+            commit_files(items, modes, staging)
+        finally:
+            for directory in staging.values():
+                rmtree(directory, ignore_errors=True)
+        start = 0
+        for pkg, pkg_items in zip(pkgs, files):
+            if pkg is None:
+                continue
+            pkg_modes = modes[start:start + len(pkg_items)]
+            start += len(pkg_items)
+            removed = remove_stale_files(pkg, pkg_items)
+            skipped = pkg_modes.count(None)
+            print("%s: %d files copied, %d skipped, %d removed" % (
+                pkg.name, len(pkg_modes) - skipped, skipped, removed))
+    return pkgs
 
 
 def remove_files(path: str = None):
@@ -86,69 +304,167 @@ def remove_files(path: str = None):
     # read the package file
     pkg = vpm.read_package(path)
     # dispath files
-    for attr in vpm.Package.__slots__:
+    for attr in vpm.Package.CATEGORIES:
         items = getattr(pkg, attr)
         if items and attr in PACKAGE_DIRS:
             cfg_dir = vpm.config_interp(cfg, "default", PACKAGE_DIRS[attr])
-            DEST_DIR = os.path.join(os.getcwd(), cfg_dir, pkg.name)
+            DEST_DIR = os.path.join(vpm.platform_dir(), cfg_dir, pkg.name)
             # remove all files
             for file in items:
                 file_path = os.path.join(DEST_DIR, os.path.basename(file))
-                if os.path.exists(file_path):
+                if os.path.lexists(file_path):
                     os.remove(file_path)
             # once files removed, remove the folder
-            if os.path.exists(DEST_DIR):
-                os.rmdir(DEST_DIR)
+            remove_directory(DEST_DIR, pkg.name)
     # return the version of the package installed
     return pkg
 
 
-def check_dependencies(path: str = None, force: bool = False):
-    if path is None or (not vpm.is_git_path(path) and not os.path.exists(path)):
-        return None
-    # read the package file
-    pkg_file = os.path.join(path, vpm.DEFAULT_PKG) if os.path.isdir(path) else path
-    pkg = vpm.read_package(pkg_file)
-    # read dependencies
-    for dep in pkg.dependencies:
-        install_package(str(dep), force)
+def remove_directory(directory: str, name: str):
+    # the directory of the package name with what is left in it
+    for path in [directory, staging_path(directory)]:
+        if not os.path.lexists(path):
+            continue
+        if os.path.basename(directory) == name and not os.path.islink(path):
+            rmtree(path, ignore_errors=True)
+        else:
+            # not a directory of the package, only removed if empty
+            try:
+                os.rmdir(path)
+            except OSError:
+                pass
+
+
+def remove_recorded_files(name: str, locked: dict, jobs: int = None):
+    """
+    remove concurrently the files of the package name recorded in
+    vpm.lock when installed, then its directories
+
+    the sources of the package are not read. return the number
+    of files removed
+    """
+    files = [os.path.join(vpm.platform_dir(), rel) for rel in locked.get("files") or {}]
+    jobs = jobs or install_jobs()
+
+    def remove(path):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    if len(files) < 2 or jobs == 1:
+        removed = [remove(path) for path in files]
+    else:
+        with ThreadPoolExecutor(max_workers=min(jobs, len(files))) as executor:
+            removed = list(executor.map(remove, files))
+    for directory in set(os.path.dirname(path) for path in files):
+        remove_directory(directory, name)
+    return removed.count(True)
+
+
+def install_plan(plan: list, force: bool = False, requested: list = []):
+    # install the resolved packages, dependencies first, unless
+    # the version chosen by the resolver is the installed one,
+    # the platform being locked until the new versions are registered
+    with vpm.manifest_lock():
+        names = [req.name for req in requested]
+        todo = []
+        for pkg, src in plan:
+            checked = not force and pkg.name not in names
+            if checked and vpm.is_package_installed(pkg, identical=True):
+                print("package %s already satisfied" % pkg.requirement())
+                continue
+            todo.append(src)
+        # download sources
+        installed = []
+        for pkg, src in zip(dispatch_packages(todo), todo):
+            if pkg is None:
+                continue
+            installed.append((pkg, src))
+            print("%s %s installed" % (pkg.name, pkg.version))
+        # register in the package.yml and pin what has been copied
+        if installed:
+            register_packages([pkg for pkg, _ in installed])
+            vpm.update_lock(installed)
 
 
 def install_package(name: str, force: bool = False):
-    if not isinstance(name, str):
-        print("verify the typed package name")
-        return None
-    pkg = vpm.Package.parse_package_name(name)
-    # check not already installed
-    if not force and vpm.is_package_installed(pkg):
-        print("package %s already satisfied" % name)
+    return install_packages([name], force)
+
+
+def install_packages(names: list, force: bool = False):
+    """
+    install several packages in one go: their versions are chosen
+    together, their files dispatched at once and the package.yml
+    written once
+    """
+    reqs = []
+    for name in names:
+        if not isinstance(name, str):
+            print("verify the typed package name")
+            return None
+        try:
+            pkg = vpm.Package.parse_package_name(name)
+        except ValueError as e:
+            print(e)
+            return None
+        # check not already installed
+        if not force and vpm.is_package_installed(pkg):
+            print("package %s already satisfied" % name)
+            continue
+        # find the source
+        if not vpm.find_sources(pkg):
+            print("%s is not found" % name)
+            return None
+        reqs.append(pkg)
+    if not reqs:
         return None
-    # find the source
-    src = [s for s in vpm.list_sources(no_print=True) if vpm.is_package(pkg, path=s)]
-    if not src:
-        print("%s is not found" % name)
+    # choose the version of each dependency before copying any file
+    try:
+        plan = vpm.resolve(reqs)
+    except vpm.ResolutionError as e:
+        print(e)
         return None
-    # check dependencies
-    check_dependencies(src[0], force)
-    # download sources
-    pkg = dispatch_files(src[0])
-    # register in the package.yml
-    register_package(pkg)
-    print("%s %s installed" % (pkg.name, pkg.version))
+    install_plan(plan, force, reqs)
+    return plan
+
+
+def read_requirements(path: str):
+    # one requirement per line, # starts a comment
+    names = []
+    with open(path, "r") as fp:
+        for line in fp:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                names.append(line)
+    return names
 
 
 def remove_package(name: str):
     if not isinstance(name, str):
         print("verify the typed package name")
         return None
-    pkg = vpm.Package.parse_package_name(name)
-    # find the source
-    srcs = [s for s in vpm.list_sources(no_print=True) if vpm.is_package(pkg, path=s)]
-    if not srcs:
-        print("%s is not found" % name)
+    try:
+        pkg = vpm.Package.parse_package_name(name)
+    except ValueError as e:
+        print(e)
         return None
-    # remove each files
-    for src in srcs:
-        remove_files(src)
-    # unregister in the package.yml
-    unregister_package(pkg)
+    with vpm.manifest_lock():
+        # files recorded when installed
+        locked = vpm.read_lock()["packages"].get(pkg.name)
+        if locked:
+            removed = remove_recorded_files(pkg.name, locked)
+            print("%s: %d files removed" % (pkg.name, removed))
+        else:
+            # installed without vpm.lock: find the source
+            srcs = vpm.find_sources(pkg)
+            if not srcs:
+                print("%s is not found" % name)
+                return None
+            # remove each files
+            for src in srcs:
+                remove_files(src)
+        # unregister in the package.yml
+        unregister_package(pkg)
+        vpm.update_lock(removed=[pkg.name])
@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
 # coding: utf-8
 
+import os
+import json
 import vpm
 
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 
 # list functions
 def list_sources(no_print: bool = False):
@@ -30,41 +35,193 @@ def list_installed(no_print: bool = False):
 
 
 def list_available(no_print: bool = False):
-    for src in list_sources(no_print):
-        pkg = vpm.read_package(src)
+    # name and version of packages from the index, listed while
+    # the sources are scanned
+    for entry in vpm.stream_entries():
+        pkg = vpm.Package(entry["name"], entry["version"])
         if not no_print:
             print(pkg)
         yield pkg
 
 
-def list_outdated(no_print: bool = False):
-    # get list of available package
-    pkgs = list(list_available(no_print=no_print))
-    # compare the version
+def available_versions():
+    # name -> versions available in the index, the latest last
+    versions = defaultdict(set)
+    for entry in vpm.index_entries():
+        # an unversioned package is not newer than any other
+        if entry["version"] in ('', None):
+            continue
+        versions[entry["name"]].add(vpm.Version(entry["version"]))
+    return {name: sorted(v, key=lambda v: v.key) for name, v in versions.items()}
+
+
+def list_outdated(no_print: bool = False, output: str = "text"):
+    """
+    installed packages for which a newer version is available
+
+    output is either text or json (one object per line)
+    """
+    versions = available_versions()
     count = 0
-    for dep in list_installed(no_print=no_print):
-        candidates = [pkg.version for pkg in pkgs if pkg > dep]
-        # for debug print all checks
-        # for pkg in pkgs:
-        #     print("avail.: %s\tinst: %s\toutdated: %s" % (str(pkg), str(dep), pkg > dep))
-        if any(candidates):
-            print("%s %s --> %s" % (dep.name, dep.version, max(candidates)))
-            count += 1
-            yield dep
-    if count == 0:
+    for dep in list_installed(no_print=True):
+        available = versions.get(dep.name)
+        if not available or not available[-1] > dep.version:
+            continue
+        count += 1
+        if no_print:
+            pass
+        elif output == "json":
+            print(json.dumps({
+                "name": dep.name,
+                "installed": str(dep.version),
+                "latest": str(available[-1])
+            }, sort_keys=True), flush=True)
+        else:
+            print("%s %s --> %s" % (dep.name, dep.version, available[-1]))
+        yield dep
+    if count == 0 and not no_print and output != "json":
         print("No outdated package found")
+
+
+def list_corrupted(no_print: bool = False, diff: bool = False, jobs: int = None,
+                   output: str = "text"):
+    """
+    verify the installed packages concurrently and yield the
+    corrupted files of each, as their verification ends
+
+    output is either text or json (one object per line)
+    """
+    # hashes recorded at install time
+    locked = vpm.read_lock()["packages"]
+    tasks = []
+    for dep in list_installed(no_print=True):
+        for entry in vpm.index_entries(dep.name):
+            if vpm.Package(entry["name"], entry["version"]) != dep:
+                continue
+            # only read the source of the same version
+            tasks.append((dep.name, str(dep.version), entry["path"],
+                          locked.get(dep.name), diff))
+    for (name, version, src), pkg_diff in check_packages(tasks, jobs):
+        if no_print:
+            pass
+        elif output == "json":
+            print(json.dumps({
+                "name": name,
+                "version": version,
+                "source": src,
+                "corrupted": pkg_diff is not None,
+                "files": pkg_diff or {}
+            }, sort_keys=True), flush=True)
+        elif pkg_diff:
+            print_corrupted(name, version, pkg_diff)
+        else:
+            print("%s %s is intact" % (name, version), flush=True)
+        yield pkg_diff
+
+
+def check_package(task: tuple, jobs: int = 1):
+    # task: name, version, source, vpm.lock entry, diff
+    name, version, src, locked, diff = task
+    candidate = vpm.read_package(src)
+    return (name, version, src), corrupted_files(candidate, locked, diff=diff, jobs=jobs)
+
+
+_WORKER_PID = None
+
+
+def check_package_worker(task: tuple, jobs: int = 1):
+    # check_package in a process of the pool, which must not
+    # share the connections of the parent process
+    global _WORKER_PID
+    if _WORKER_PID != os.getpid():
+        vpm.reset_github_session()
+        _WORKER_PID = os.getpid()
+    return check_package(task, jobs)
+
+
+def check_packages(tasks: list, jobs: int = None):
+    # one process per package, results in the order they are ready
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(tasks) < 2:
+        for task in tasks:
+            yield check_package(task, jobs=jobs)
         return
+    # the jobs left are shared by the processes to hash the files
+    processes = min(jobs, len(tasks))
+    threads = max(1, jobs // processes)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(check_package_worker, task, threads) for task in tasks]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def corrupted_files(candidate: vpm.Package, locked: dict = None, diff: bool = False,
+                    jobs: int = None):
+    """
+    new, removed and modified files of the installed candidate
+
+    files are compared by hash: the one recorded in vpm.lock when
+    installed from the same version, the git sha of remote files or
+    else the hash of the source. the textual diff of modified files
+    is only computed if diff is set
+    """
+    installed = vpm.retrieve_files(candidate.name)
+    if locked and locked.get("version") != str(candidate.version):
+        locked = None
+    recorded = (locked or {}).get("files") or {}
+    db = defaultdict(dict)
+    pairs, hashes = [], []
+    for category in vpm.Package.CATEGORIES:
+        if category not in vpm.PACKAGE_DIRS:
+            continue
+        cat_a = {os.path.basename(f): f for f in getattr(candidate, category) or []}
+        cat_b = {os.path.basename(f): f for f in getattr(installed, category) or []}
+        new_files = sorted(set(cat_b) - set(cat_a))
+        removed_files = sorted(set(cat_a) - set(cat_b))
+        if new_files:
+            db[category]["new"] = new_files
+        if removed_files:
+            db[category]["removed"] = removed_files
+        for name in sorted(set(cat_a) & set(cat_b)):
+            file_a, file_b = cat_a[name], cat_b[name]
+            rel = os.path.relpath(file_b, vpm.platform_dir())
+            record = recorded.get(rel.replace(os.sep, "/"))
+            kind = "sha256"
+            if record:
+                expected = record.get("sha256")
+            elif hasattr(file_a, "entry"):
+                # remote files are not downloaded
+                expected, kind = file_a.entry.get("sha"), "git"
+            else:
+                # position of the hash of the source
+                expected = len(hashes)
+                hashes.append((file_a, "sha256"))
+            pairs.append((category, name, file_a, file_b, expected, len(hashes)))
+            hashes.append((file_b, kind))
+    # hash the sources and installed files at once
+    digests = vpm.hash_files(hashes, jobs)
+    for category, name, file_a, file_b, expected, i in pairs:
+        if isinstance(expected, int):
+            expected = digests[expected]
+        if digests[i] == expected:
+            continue
+        db[category][name] = vpm.Package.file_diff(file_a, file_b) if diff else None
+    if db:
+        return dict(db)
+    return None
 
 
-def list_corrupted(no_print: bool = False):
-    # get list of available package
-    pkgs = list(list_available(no_print=no_print))
-    # compare packages
-    for dep in list_installed(no_print=no_print):
-        for candidate in [pkg for pkg in pkgs if pkg == dep]:
-            # for debug
-            # print("dep: %s\tcandidate: %s" % (dep, candidate))
-            pkg_inst = vpm.retrieve_files(dep.name)
-            pkg_inst.version = dep.version
-            pkg_diff = vpm.Package.unified_diff(candidate, pkg_inst)
-            yield pkg_diff
+def print_corrupted(name: str, version: str, db: dict):
+    lines = ["%s %s is corrupted" % (name, version)]
+    for category, files in db.items():
+        for file in files.get("new", []):
+            lines.append("\tnew %s file %s" % (category, file))
+        for file in files.get("removed", []):
+            lines.append("\tremoved %s file %s" % (category, file))
+        for file, diff in files.items():
+            if file in ("new", "removed"):
+                continue
+            lines.append("\tmodified %s file %s" % (category, file))
+            if diff:
+                lines.append(diff)
+    print("\n".join(lines), flush=True)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import os
+import time
+import hashlib
+import vpm
+
+from concurrent.futures import ThreadPoolExecutor
+
+LOCK_NAME = "vpm.lock"
+LOCK_VERSION = 1
+
+# the lock pins for each installed package its version, its source,
+# the commit (tree sha) of git sources and the hash of each file copied
+# such that an install --frozen neither resolves nor scans the sources
+
+
+def lock_path(path: str = None):
+    return os.path.join(path or vpm.platform_dir(), LOCK_NAME)
+
+
+def read_lock(path: str = None):
+    path = path or lock_path()
+    lock = None
+    if os.path.exists(path):
+        with open(path, "r") as fp:
+            lock = vpm.yaml_load(fp)
+    if not isinstance(lock, dict) or lock.get("version") != LOCK_VERSION:
+        lock = {"version": LOCK_VERSION, "packages": {}}
+    lock["packages"] = lock.get("packages") or {}
+    return lock
+
+
+def write_lock(lock: dict, path: str = None):
+    path = path or lock_path()
+    tmp = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmp, "w+") as fp:
+        vpm.yaml_dump(lock, fp)
+    os.replace(tmp, path)
+    return path
+
+
+def file_sha256(path: str):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def git_blob_sha(path: str):
+    # sha of the file as stored by git
+    digest = hashlib.sha1(("blob %d\0" % os.path.getsize(path)).encode("utf-8"))
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_files(files: list, jobs: int = None):
+    # files: (path, "sha256" or "git") hashed concurrently, None if missing
+    def digest(item):
+        path, kind = item
+        if not os.path.isfile(path):
+            return None
+        return git_blob_sha(path) if kind == "git" else file_sha256(path)
+
+    if len(files) < 2 or jobs == 1:
+        return [digest(item) for item in files]
+    jobs = min(jobs or os.cpu_count() or 1, len(files))
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(digest, files))
+
+
+def file_entry(dest: str, previous: dict = None):
+    # hash of dest, reused from the previous entry when its stat is the same
+    st = os.stat(dest)
+    previous = previous or {}
+    if previous.get("mtime") == st.st_mtime_ns and previous.get("size") == st.st_size:
+        sha256 = previous.get("sha256")
+    else:
+        sha256 = file_sha256(dest)
+    # a file modified within RACY_DELAY could change without its stat
+    racy = time.time() - st.st_mtime < vpm.RACY_DELAY
+    return {
+        "sha256": sha256,
+        "size": st.st_size,
+        "mtime": None if racy else st.st_mtime_ns
+    }
+
+
+def lock_package(pkg: vpm.Package, src: str, previous: dict = None):
+    # entry of an installed package
+    commit = None
+    if vpm.is_git_path(src):
+        commit = vpm.github_tree(*vpm.git_path_args(src)[:2]).get("sha")
+    previous = (previous or {}).get("files") or {}
+    files = {}
+    for file, dest in vpm.package_destinations(pkg):
+        rel = os.path.relpath(dest, vpm.platform_dir()).replace(os.sep, "/")
+        entry = file_entry(dest, previous.get(rel))
+        if hasattr(file, "entry"):
+            entry["blob"] = file.entry.get("sha")
+            entry["url"] = file.entry.get("url")
+        else:
+            entry["origin"] = os.path.abspath(file)
+        files[rel] = entry
+    return {
+        "version": None if pkg.version.value is None else str(pkg.version),
+        "source": vpm.source_key(src),
+        "commit": commit,
+        "files": files
+    }
+
+
+def update_lock(installed: list = [], removed: list = []):
+    # installed: (package, source) copied, removed: package names
+    if not installed and not os.path.exists(lock_path()):
+        return None
+    lock = read_lock()
+    for pkg, src in installed:
+        lock["packages"][pkg.name] = lock_package(pkg, src, lock["packages"].get(pkg.name))
+    for name in removed:
+        lock["packages"].pop(name, None)
+    return write_lock(lock)
+
+
+def locked_file(entry: dict):
+    # path to copy the file from
+    if entry.get("blob"):
+        return vpm.github_fetch({"sha": entry["blob"], "url": entry.get("url")})
+    return entry.get("origin")
+
+
+def install_frozen(path: str = None):
+    # install exactly what the lock records
+    lock = read_lock(lock_path(path))
+    if not lock["packages"]:
+        print("%s not found or empty" % LOCK_NAME)
+        return None
+    base = path or vpm.platform_dir()
+    mode = vpm.install_mode()
+    failed, installed = [], []
+    # the files of the platform are installed by a process at a time
+    with vpm.manifest_lock(path):
+        for name, locked in lock["packages"].items():
+            ok = True
+            for rel, entry in locked.get("files", {}).items():
+                dest = os.path.join(base, rel)
+                # already there and intact
+                if os.path.exists(dest) and file_sha256(dest) == entry["sha256"]:
+                    continue
+                origin = locked_file(entry)
+                if not origin or not os.path.exists(origin):
+                    print("%s of %s is missing" % (rel, name))
+                    ok = False
+                    continue
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                # only put in place once checked against the lock
+                tmp = vpm.cache_tmp_path(dest)
+                try:
+                    vpm.install_file(origin, tmp, mode if "origin" in entry else "copy")
+                    if file_sha256(tmp) != entry["sha256"]:
+                        print("%s of %s does not match %s" % (rel, name, LOCK_NAME))
+                        ok = False
+                    else:
+                        os.replace(tmp, dest)
+                finally:
+                    if os.path.lexists(tmp):
+                        os.remove(tmp)
+            if not ok:
+                failed.append(name)
+                continue
+            installed.append(vpm.Package(name, locked.get("version")))
+            print("%s %s installed" % (name, locked.get("version")))
+        if installed:
+            vpm.register_packages(installed)
+    return failed
@@ -5,10 +5,42 @@
 import os
 import re
 import difflib
+import vpm
 
 from collections import defaultdict
 
 
+def local_path(file: str):
+    # remote files are only downloaded when accessed
+    return file.local_path() if hasattr(file, "local_path") else file
+
+
+def same_content(file_a: str, file_b: str, chunk_size: int = 1 << 16):
+    # byte comparison by chunks, stopping at the first difference
+    if os.path.getsize(file_a) != os.path.getsize(file_b):
+        return False
+    with open(file_a, "rb") as fa, open(file_b, "rb") as fb:
+        while True:
+            chunk = fa.read(chunk_size)
+            if chunk != fb.read(chunk_size):
+                return False
+            if not chunk:
+                return True
+
+
+def is_binary(file: str):
+    # as git, a NUL byte in the first 8K
+    with open(file, "rb") as fp:
+        return b"\0" in fp.read(8192)
+
+
+RE_DIGITS = re.compile(r"^[0-9]+$")
+RE_COMPONENT = re.compile(r"^([0-9]*)(.*)$")
+# parsed versions by (type, value)
+_VERSIONS = {}
+MAX_VERSIONS = 100000
+
+
 class Version(object):
     """
     Version of a package could either be
@@ -22,155 +54,238 @@ class Version(object):
 
     Depending on the context, None can either mean any version or
     no version attributed/detected
-    """
-    __slots__ = ["value", "major", "minor", "release"]
 
-    def __init__(self, value: str = None):
-        self.value = value
-        self.major = None
-        self.minor = None
-        self.release = None
+    versions are immutable and parsed once: the same value gives the
+    same instance. they are compared, hashed and sorted by their key
+    where '' and None are the latest version and a suffix of a number
+    marks a pre-release (1.0.0-rc1 < 1.0.0)
+    """
+    __slots__ = ["value", "major", "minor", "release", "key"]
+
+    def __new__(cls, value: str = None):
+        if isinstance(value, Version):
+            return value
+        cache_key = (type(value), value)
+        try:
+            return _VERSIONS[cache_key]
+        except (KeyError, TypeError):
+            pass
+        version = object.__new__(cls)
+        version.parse(value)
+        if len(_VERSIONS) >= MAX_VERSIONS:
+            _VERSIONS.clear()
+        try:
+            _VERSIONS[cache_key] = version
+        except TypeError:
+            # not hashable
+            pass
+        return version
+
+    def parse(self, value):
+        major, minor, release = None, None, None
         if isinstance(value, str):
-            self.value = value.strip()
-            if self.value:
+            value = value.strip()
+            if value:
                 elements = value.split('.')
                 # major.minor.release
                 if len(elements) == 3:
-                    self.major, self.minor, self.release = elements
                     # if values contains only digits parse them
                     # to get good comparison results
-                    for attribute in self.__slots__:
-                        v = getattr(self, attribute)
-                        if all([c in "0123456789" for c in v.strip()]):
-                            setattr(self, attribute, int(v, 10))
-                        else:
-                            setattr(self, attribute, v.strip())
-                    self.value = "%s.%s.%s" % (self.major, self.minor, self.release)
+                    major, minor, release = [
+                        int(v.strip()) if RE_DIGITS.match(v.strip()) else v.strip()
+                        for v in elements
+                    ]
+                    value = "%s.%s.%s" % (major, minor, release)
         elif isinstance(value, int):
-            self.major = value
-            self.minor = 0
-            self.release = 0
+            major, minor, release = value, 0, 0
         elif isinstance(value, float):
-            self.major = int(value)
-            self.minor = int((value - int(value)) * 1000)
-            self.release = 0
+            major = int(value)
+            minor = int((value - int(value)) * 1000)
+            release = 0
+        object.__setattr__(self, "value", value)
+        object.__setattr__(self, "major", major)
+        object.__setattr__(self, "minor", minor)
+        object.__setattr__(self, "release", release)
+        object.__setattr__(self, "key", self.sort_key())
+
+    def sort_key(self):
+        # (1,) for the latest version else (0, components)
+        if self.value in ('', None):
+            return (1,)
+        if self.is_mmr():
+            elements = [self.major, self.minor, self.release]
         else:
-            self.value = value
-            self.major, self.minor, self.release = None, None, None
+            elements = str(self.value).split('.')
+        components = [_component_key(e) for e in elements]
+        # 1.2 is 1.2.0 and 1.2.0.0
+        components += [(0, 1, "")] * (3 - len(components))
+        while len(components) > 3 and components[-1] == (0, 1, ""):
+            components.pop()
+        return (0, tuple(components))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Version is immutable")
+
+    def __reduce__(self):
+        return (Version, (self.value,))
 
     def is_mmr(self):
         return (self.major is not None) and \
                (self.minor is not None) and (self.release is not None)
 
+    def __hash__(self):
+        return hash(self.key)
+
     def __eq__(self, version):
-        if isinstance(version, Version):
-            if isinstance(version.value, type(self.value)):
-                return self.value == version.value
-            return (self.major == version.major) and \
-                   (self.minor == version.minor) and \
-                   (self.release == version.release)
-        return self == Version(version)
+        if version.__class__ is not Version:
+            version = Version(version)
+        return self.key == version.key
 
     def __ne__(self, version):
-        if isinstance(version, Version):
-            if isinstance(version.value, type(self.value)):
-                return self.value != version.value
-            return (self.major != version.major) or \
-                   (self.minor != version.minor) or \
-                   (self.release != version.release)
-        return self != Version(version)
+        if version.__class__ is not Version:
+            version = Version(version)
+        return self.key != version.key
 
     def __gt__(self, version):
-        if isinstance(version, Version):
-            if self.is_mmr() and version.is_mmr():
-                if self.major is None or version.major is None:
-                    return False
-                if self.major > version.major:
-                    return True
-                if self.minor is None or version.minor is None:
-                    return False
-                if self.minor > version.minor:
-                    return True
-                if self.release is None or version.release is None:
-                    return False
-                return self.release > version.release
-            # always latest value if '' or None
-            if self.value in ('', None):
-                return version.value not in ('', None)
-            if version.value in ('', None):
-                return False
-            return self.value > version.value
-        return self > Version(version)
+        if version.__class__ is not Version:
+            version = Version(version)
+        return self.key > version.key
 
     def __ge__(self, version):
-        if isinstance(version, Version):
-            if self.is_mmr() and version.is_mmr():
-                if self.major is None or version.major is None:
-                    return False
-                if self.major > version.major:
-                    return True
-                if self.minor is None or version.minor is None:
-                    return False
-                if self.minor > version.minor:
-                    return True
-                if self.release is None or version.release is None:
-                    return False
-                return self.release >= version.release
-            # always latest value if '' or None
-            if self.value in ('', None):
-                return True
-            if version.value in ('', None):
-                return self.value in ('', None)
-            return self.value >= version.value
-        return self >= Version(version)
+        if version.__class__ is not Version:
+            version = Version(version)
+        return self.key >= version.key
 
     def __le__(self, version):
-        if isinstance(version, Version):
-            if self.is_mmr() and version.is_mmr():
-                if self.major is None or version.major is None:
-                    return False
-                if self.major < version.major:
-                    return True
-                if self.minor is None or version.minor is None:
-                    return False
-                if self.minor < version.minor:
-                    return True
-                if self.release is None or version.release is None:
-                    return False
-                return self.release <= version.release
-            # always latest value if '' or None
-            if version.value in ('', None):
-                return True
-            if self.value in ('', None):
-                return version.value in ('', None)
-            return self.value <= version.value
-        return self <= Version(version)
+        if version.__class__ is not Version:
+            version = Version(version)
+        return self.key <= version.key
 
     def __lt__(self, version):
-        if isinstance(version, Version):
-            if self.is_mmr() and version.is_mmr():
-                if self.major is None or version.major is None:
-                    return False
-                if self.major < version.major:
-                    return True
-                if self.minor is None or version.minor is None:
-                    return False
-                if self.minor < version.minor:
-                    return True
-                if self.release is None or version.release is None:
-                    return False
-                return self.release < version.release
-            # always latest value if '' or None
-            if self.value in ('', None):
-                return False
-            if version.value in ('', None):
-                return self.value not in ('', None)
-            return self.value < version.value
-        return self < Version(version)
+        if version.__class__ is not Version:
+            version = Version(version)
+        return self.key < version.key
 
     def __str__(self):
         return str(self.value)
 
+    def __repr__(self):
+        return "Version(%r)" % (self.value,)
+
+
+def _component_key(element):
+    # (number or -1, 0 for a pre-release else 1, suffix)
+    if isinstance(element, int):
+        return (element, 1, "")
+    number, suffix = RE_COMPONENT.match(element.strip()).groups()
+    # build metadata does not change the precedence
+    if suffix.startswith("+"):
+        suffix = ""
+    return (int(number) if number else -1, 0 if suffix else 1, suffix.lstrip("-"))
+
+
+RE_CONSTRAINT = re.compile(r"^\s*(>=|<=|>|=|<)?\s*([\w\d\.\-\+]*)\s*$")
+
+
+class VersionRange(object):
+    """
+    Versions accepted by a requirement such as '>= 1.2.0, < 2.0.0'
+
+    each constraint is an operator and a version, a version without
+    operator accepts the version or a newer one and an empty version
+    accepts any. the constraints are reduced to a lower and an upper
+    bound (key, inclusive) so that the containment of a version and the
+    intersection of two ranges are a couple of key comparisons
+    """
+    __slots__ = ["constraints", "lower", "upper"]
+
+    def __init__(self, constraints: list = []):
+        self.constraints = tuple(constraints)
+        self.lower, self.upper = None, None
+        for operator, version in self.constraints:
+            version = Version(version)
+            if version.value in ('', None):
+                continue
+            if operator in (None, ">=", ">", "="):
+                self.lower = _tighter(self.lower, (version.key, operator != ">"), 1)
+            if operator in ("<=", "<", "="):
+                self.upper = _tighter(self.upper, (version.key, operator != "<"), -1)
+
+    @staticmethod
+    def parse(spec: str):
+        constraints = []
+        for text in (spec or "").split(","):
+            m = RE_CONSTRAINT.match(text)
+            if not m:
+                raise ValueError("invalid version constraint '%s'" % text.strip())
+            operator, version = m.groups()
+            if operator or version:
+                constraints.append((operator or None, Version(version)))
+        return VersionRange(constraints)
+
+    def contains(self, version):
+        if version.__class__ is not Version:
+            version = Version(version)
+        key = version.key
+        if self.lower is not None:
+            if key < self.lower[0] or (key == self.lower[0] and not self.lower[1]):
+                return False
+        if self.upper is not None:
+            if key > self.upper[0] or (key == self.upper[0] and not self.upper[1]):
+                return False
+        return True
+
+    def __contains__(self, version):
+        return self.contains(version)
+
+    def intersection(self, other):
+        # versions accepted by both ranges
+        rng = VersionRange.__new__(VersionRange)
+        rng.constraints = self.constraints + other.constraints
+        rng.lower = _tighter(self.lower, other.lower, 1)
+        rng.upper = _tighter(self.upper, other.upper, -1)
+        return rng
+
+    def is_empty(self):
+        if self.lower is None or self.upper is None:
+            return False
+        if self.lower[0] == self.upper[0]:
+            return not (self.lower[1] and self.upper[1])
+        return self.lower[0] > self.upper[0]
+
+    def __eq__(self, other):
+        return isinstance(other, VersionRange) and \
+            (self.lower, self.upper) == (other.lower, other.upper)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.lower, self.upper))
+
+    def __str__(self):
+        return ", ".join(
+            " ".join(v for v in [operator, str(version)] if v)
+            for operator, version in self.constraints
+        )
+
+    def __repr__(self):
+        return "VersionRange(%r)" % str(self)
+
+
+def _tighter(bound_a, bound_b, direction: int):
+    # the bound (key, inclusive) excluding the most versions
+    # direction is 1 for lower bounds and -1 for upper bounds
+    if bound_a is None:
+        return bound_b
+    if bound_b is None:
+        return bound_a
+    if bound_a[0] == bound_b[0]:
+        return (bound_a[0], bound_a[1] and bound_b[1])
+    if (bound_a[0] > bound_b[0]) == (direction > 0):
+        return bound_a
+    return bound_b
+
 
 class Package(object):
     __slots__ = [
@@ -182,8 +297,13 @@ class Package(object):
         "designs",
         "dependencies",
         "libraries",
-        "models"
+        "models",
+        "range"
     ]
+    # files of a package, by category
+    CATEGORIES = ["assertions", "constraints", "designs", "libraries", "models"]
+    # attributes described in a package.yml
+    FIELDS = ["name", "version", "description", "dependencies"] + CATEGORIES
 
     def __init__(self, name: str = None, version: str = None):
         if isinstance(name, str):
@@ -198,6 +318,8 @@ class Package(object):
         self.designs = []
         self.libraries = []
         self.models = []
+        # versions accepted when used as a dependency
+        self.range = None
 
     def __eq__(self, pkg):
         return (self.name == pkg.name) and (self.version == pkg.version)
@@ -236,12 +358,39 @@ class Package(object):
     def __str__(self):
         return "%s %s" % (self.name, self.version)
 
+    def copy(self):
+        # lists and dependencies are not shared with the copy
+        pkg = Package.__new__(Package)
+        for attr in Package.FIELDS + ["range"]:
+            values = getattr(self, attr)
+            if attr == "dependencies":
+                values = [dep.copy() for dep in values]
+            elif isinstance(values, list):
+                values = list(values)
+            setattr(pkg, attr, values)
+        return pkg
+
+    def requirement(self):
+        # <name> <operator> <version>, ... as written in a package.yml
+        if self.range is not None:
+            spec = str(self.range)
+        else:
+            spec = "" if self.version.value is None else str(self.version)
+        return " ".join(v for v in [self.name, spec] if v)
+
+    def version_range(self):
+        # without a parsed range, the version or a newer one
+        if self.range is not None:
+            return self.range
+        return VersionRange([(None, self.version)])
+
     def to_dict(self):
         p = {}
-        for attr in self.__slots__:
+        for attr in self.FIELDS:
             values = getattr(self, attr)
             if attr == "dependencies":
-                p[attr] = [str(v) for v in values]
+                # with their operators, so that the range is kept
+                p[attr] = [v.requirement() for v in values]
             elif isinstance(values, list):
                 p[attr] = [v.to_dict() if "to_dict" in dir(v) else v for v in values]
             elif isinstance(values, dict):
@@ -275,18 +424,73 @@ class Package(object):
     def parse_package_name(pkg_name: str):
         if not isinstance(pkg_name, str):
             return None
-        # assume <name><operator><version>
-        RE_PKG_NAME_VERSION = r"([\w\_\-]+)\s*(?:>|>=|=|<|<=)?\s*([\w\d\.\-]*)?$"
-        m = re.findall(RE_PKG_NAME_VERSION, pkg_name, flags=re.MULTILINE)
-        return Package(*m[0])
+        # assume <name><operator><version>[, <operator><version>]
+        RE_PKG_NAME_VERSION = r"^\s*([\w\_\-]+)\s*((?:>=|<=|>|=|<)?\s*[\w\d\.\-\+]*" \
+                              r"(?:\s*,\s*(?:>=|<=|>|=|<)?\s*[\w\d\.\-\+]+)*)\s*$"
+        m = re.match(RE_PKG_NAME_VERSION, pkg_name)
+        if not m:
+            raise ValueError("invalid package requirement '%s'" % pkg_name)
+        name, spec = m.groups()
+        rng = VersionRange.parse(spec)
+        # the version of the first constraint
+        pkg = Package(name, rng.constraints[0][1] if rng.constraints else "")
+        pkg.range = rng
+        return pkg
+
+    @staticmethod
+    def iter_diff(file_a: str, file_b: str, max_size: int = None, max_output: int = None):
+        """
+        hunks of the unified diff of two files, computed lazily
+
+        identical files are detected by comparing their bytes by chunks
+        and yield nothing. binary files and files above max_size bytes
+        only yield a summary. the diff stops after max_output bytes
+        """
+        if max_size is None:
+            max_size = vpm.parse_size(vpm.config_value("diff", "max_size", "16M"))
+        if max_output is None:
+            max_output = vpm.parse_size(vpm.config_value("diff", "max_output", "1M"))
+        path_a, path_b = local_path(file_a), local_path(file_b)
+        if same_content(path_a, path_b):
+            return
+        size_a, size_b = os.path.getsize(path_a), os.path.getsize(path_b)
+        if is_binary(path_a) or is_binary(path_b):
+            yield "Binary files %s and %s differ\n" % (file_a, file_b)
+            return
+        if max(size_a, size_b) > max_size:
+            yield "Files %s (%d bytes) and %s (%d bytes) differ, too large to diff\n" % (
+                file_a, size_a, file_b, size_b)
+            return
+        with open(path_a, "r", errors="replace") as fp:
+            content_a = fp.readlines()
+        with open(path_b, "r", errors="replace") as fp:
+            content_b = fp.readlines()
+        hunk, size = [], 0
+        lines = difflib.unified_diff(content_a, content_b, fromfile=file_a, tofile=file_b)
+        for line in lines:
+            if line.startswith("@@") and hunk and not hunk[-1].startswith("+++"):
+                yield "".join(hunk)
+                hunk = []
+            if not line.endswith("\n"):
+                line += "\n"
+            size += len(line)
+            if size > max_output:
+                hunk.append("... diff truncated after %d bytes\n" % max_output)
+                break
+            hunk.append(line)
+        if hunk:
+            yield "".join(hunk)
+
+    @staticmethod
+    def file_diff(file_a: str, file_b: str):
+        return "".join(Package.iter_diff(file_a, file_b))
 
     @staticmethod
-    def unified_diff(pkga, pkgb, no_print: bool = False):
+    def unified_diff(pkga, pkgb, no_print: bool = False, stream: bool = False):
+        # with stream, modified files map to a lazy generator of hunks
         db = defaultdict(dict)
         # for each category...
-        for category in Package.__slots__:
-            if category in ["name", "version", "description", "dependencies"]:
-                continue
+        for category in Package.CATEGORIES:
             # detect new and removed files
             cat_a = getattr(pkga, category) if pkga else None
             cat_b = getattr(pkgb, category) if pkgb else None
@@ -327,15 +531,11 @@ class Package(object):
                 for file in files_in_both:
                     file_a = [f for f in cat_a if os.path.basename(f) == file]
                     file_b = [f for f in cat_b if os.path.basename(f) == file]
-                    with open(file_a[-1], "r+") as fp:
-                        content_a = fp.readlines()
-                    with open(file_b[-1], "r+") as fp:
-                        content_b = fp.readlines()
-                    diff = '\n'.join(difflib.unified_diff(
-                        content_a, content_b,
-                        fromfile=file_a[-1],
-                        tofile=file_b[-1]
-                    ))
+                    if stream:
+                        if not same_content(local_path(file_a[-1]), local_path(file_b[-1])):
+                            db[category][file] = Package.iter_diff(file_a[-1], file_b[-1])
+                        continue
+                    diff = Package.file_diff(file_a[-1], file_b[-1])
                     if diff:
                         db[category][file] = diff
         if db:
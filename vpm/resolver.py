@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+import vpm
+
+
+class ResolutionError(Exception):
+    pass
+
+
+def satisfies(pkg: vpm.Package, req: vpm.Package):
+    # a dependency without operator accepts the version or a newer one
+    return pkg.name == req.name and req.version_range().contains(pkg.version)
+
+
+def index_candidates(name: str):
+    # (package, source) of each version available, the newest first
+    candidates = []
+    for entry in vpm.index_entries(name):
+        pkg = vpm.Package(entry["name"], entry["version"])
+        pkg.dependencies = [
+            vpm.Package.parse_package_name(dep) for dep in entry.get("dependencies") or []
+        ]
+        candidates.append((pkg, entry["path"]))
+    # stable: for the same version the first source wins
+    return sorted(candidates, key=lambda c: c[0].version.key, reverse=True)
+
+
+def resolve(requirements: list, candidates=index_candidates):
+    """
+    choose a version of each package needed by the requirements
+    such that every constraint of the dependency graph holds
+
+    packages are decided once all the packages which could depend
+    on them are, so that their constraints are known. the newest
+    matching version is taken and the choices are undone only when
+    no version remains. in a cycle, a package can be required once
+    its position is passed: it is then decided after the others.
+    return the (package, source) to install with the dependencies
+    before the packages using them
+    """
+    known = {}
+
+    def options(name):
+        if name not in known:
+            known[name] = candidates(name)
+        return known[name]
+
+    order = decision_order([req.name for req in requirements], options)
+    constraints = {}
+    for req in requirements:
+        constraints.setdefault(req.name, []).append((req, None))
+    chosen = {}
+    # decisions: [position, matching candidates, next to try, added constraints]
+    stack = []
+    conflict = None
+    k = 0
+    while True:
+        if k >= len(order):
+            # required by a package decided after their position
+            pending = _pending_names(order, constraints, chosen)
+            if not pending:
+                break
+            order.extend(pending)
+        name = order[k]
+        reqs = constraints.get(name)
+        # not needed by the packages chosen so far, or already decided
+        if not reqs or name in chosen:
+            k += 1
+            continue
+        # the constraints on a package reduce to a single range
+        allowed = reqs[0][0].version_range()
+        for req, _ in reqs[1:]:
+            allowed = allowed.intersection(req.version_range())
+        if allowed.is_empty():
+            matching = []
+        else:
+            matching = [c for c in options(name) if allowed.contains(c[0].version)]
+        if not matching:
+            conflict = (name, list(reqs))
+        stack.append([k, matching, 0, []])
+        # take the next candidate of the last decision, backtrack when none is left
+        while stack:
+            frame = stack[-1]
+            k, matching, i, added = frame
+            name = order[k]
+            chosen.pop(name, None)
+            for dep_name in added:
+                constraints[dep_name].pop()
+            del added[:]
+            if i >= len(matching):
+                stack.pop()
+                continue
+            frame[2] += 1
+            pkg, src = matching[i]
+            chosen[name] = (pkg, src)
+            deps = [dep for dep in pkg.dependencies if dep]
+            # only in cycles a dependency is already chosen
+            failed = [dep for dep in deps if dep.name in chosen and
+                      not satisfies(chosen[dep.name][0], dep)]
+            if failed:
+                dep = failed[0]
+                conflict = (dep.name, constraints.get(dep.name, []) + [(dep, pkg)])
+                continue
+            for dep in deps:
+                constraints.setdefault(dep.name, []).append((dep, pkg))
+                added.append(dep.name)
+            break
+        else:
+            raise ResolutionError(_conflict_message(conflict, options))
+        k += 1
+    return install_order(chosen)
+
+
+def decision_order(names: list, options):
+    # packages reachable through any version, the ones depending
+    # on a package before it (cycles are broken where entered)
+    order, visited = [], set()
+    for root in names:
+        if root in visited:
+            continue
+        visited.add(root)
+        stack = [(root, _dependency_names(options(root)))]
+        while stack:
+            name, deps = stack[-1]
+            for dep in deps:
+                if dep not in visited:
+                    visited.add(dep)
+                    stack.append((dep, _dependency_names(options(dep))))
+                    break
+            else:
+                stack.pop()
+                order.append(name)
+    order.reverse()
+    return order
+
+
+def install_order(chosen: dict):
+    # dependencies first, cycles are broken where they are entered
+    order, visited = [], set()
+    for root in chosen:
+        if root in visited:
+            continue
+        visited.add(root)
+        stack = [(root, iter(chosen[root][0].dependencies))]
+        while stack:
+            name, deps = stack[-1]
+            for dep in deps:
+                if dep and dep.name in chosen and dep.name not in visited:
+                    visited.add(dep.name)
+                    stack.append((dep.name, iter(chosen[dep.name][0].dependencies)))
+                    break
+            else:
+                stack.pop()
+                order.append(chosen[name])
+    return order
+
+
+def _pending_names(order: list, constraints: dict, chosen: dict):
+    names, seen = [], set()
+    for name in order:
+        if name not in seen and constraints.get(name) and name not in chosen:
+            names.append(name)
+        seen.add(name)
+    return names
+
+
+def _dependency_names(candidates: list):
+    names = []
+    for pkg, _ in candidates:
+        names.extend(dep.name for dep in pkg.dependencies if dep and dep.name not in names)
+    return iter(names)
+
+
+def _conflict_message(conflict, options):
+    name, reqs = conflict
+    if not options(name):
+        return "%s is not found" % name
+    wanted = ", ".join(
+        "%s (%s)" % (req.requirement(), "requested" if by is None else "by %s" % by)
+        for req, by in reqs
+    )
+    return "no version of %s satisfies %s" % (name, wanted)
@@ -2,11 +2,42 @@
 # coding: utf-8
 
 import os
+import sys
 import vpm
+import json
+import time
 import yaml
+import hashlib
+import threading
 
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # not available on windows
+    fcntl = None
+
+# use libyaml when available
+try:
+    from yaml import CSafeLoader as YamlLoader, CSafeDumper as YamlDumper
+except ImportError:
+    from yaml import SafeLoader as YamlLoader, SafeDumper as YamlDumper
 
 DEFAULT_PKG = "package.yml"
+# a file modified less than RACY_DELAY seconds before being cached
+# could be modified again without its (mtime, size) changing
+RACY_DELAY = 2.0
+
+# parsed packages of this process keyed by path
+_PACKAGE_CACHE = {}
+
+# file locked while the package.yml, vpm.lock and installed files
+# of a platform are modified, named apart from vpm.lock
+PLATFORM_LOCK = ".package.yml.lock"
+# platforms locked by this process: directory -> [fd, depth]
+_MANIFEST_LOCK = threading.RLock()
+_MANIFEST_FDS = {}
 
 
 def read_package(path: str = None, content: str = None):
@@ -16,33 +47,165 @@ def read_package(path: str = None, content: str = None):
             return get_git_package(path)
         # create package file if none
         pkg_file = get_package_path(path)
-        # check in the package file
-        with open(pkg_file, "r+") as fp:
-            pkg = yaml.load(fp, Loader=yaml.FullLoader)
+        return _read_cached_package(pkg_file).copy()
     elif isinstance(content, dict):
         pkg_file = path
         pkg = content
     else:
         pkg_file = path
-        pkg = yaml.load(content, Loader=yaml.FullLoader)
+        pkg = yaml_load(content)
     # adjust file path
-    for attr in vpm.Package.__slots__:
-        if attr in ["name", "version", "description", "dependencies"]:
-            continue
+    base_dir = os.path.dirname(pkg_file)
+    for attr in vpm.Package.CATEGORIES:
         files = pkg.get(attr, [])
         if files:
             pkg[attr] = [
-                os.path.abspath(
-                    os.path.join(os.path.dirname(pkg_file), file)
-                ) for file in files]
+                os.path.abspath(os.path.join(base_dir, file)) for file in files
+            ]
     return vpm.Package.from_dict(pkg)
 
 
 def write_package(pkg, path: str = None):
     # create package file if none
     pkg_file = get_package_path(path)
-    with open(pkg_file, "w+") as fp:
-        yaml.dump(pkg.to_dict(), fp)
+    _PACKAGE_CACHE.pop(os.path.abspath(pkg_file), None)
+    # an interrupted write leaves the previous package.yml
+    tmp = vpm.cache_tmp_path(pkg_file)
+    try:
+        with open(tmp, "w+") as fp:
+            yaml_dump(pkg.to_dict(), fp)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp, pkg_file)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+@contextmanager
+def manifest_lock(path: str = None):
+    """
+    advisory lock of the platform of the package.yml of path
+
+    a dedicated .package.yml.lock file is locked such that the
+    package.yml can be replaced while the lock is held. vpm processes
+    of the same platform wait for each other, threads of the process
+    too, and the lock can be taken again by the thread holding it
+    """
+    directory = os.path.dirname(os.path.abspath(get_package_path(path)))
+    with _MANIFEST_LOCK:
+        held = _MANIFEST_FDS.get(directory)
+        if held is None:
+            held = _MANIFEST_FDS[directory] = [_lock_platform(directory), 0]
+        held[1] += 1
+        try:
+            yield directory
+        finally:
+            held[1] -= 1
+            if held[1] == 0:
+                del _MANIFEST_FDS[directory]
+                if held[0] is not None:
+                    # closing the descriptor releases the lock
+                    os.close(held[0])
+
+
+@contextmanager
+def package_transaction(path: str = None):
+    # the package.yml of path, written back once if no error occurred
+    with manifest_lock(path):
+        pkg = read_package(path)
+        yield pkg
+        write_package(pkg, path)
+
+
+def _lock_platform(directory: str):
+    # lock file of the platform opened for writing, as required by
+    # the posix locks which, unlike flock, are supported over nfs
+    path = os.path.join(directory, PLATFORM_LOCK)
+    if fcntl is None:
+        print("warning: %s cannot be locked on this platform" % path, file=sys.stderr)
+        return None
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o666)
+    try:
+        fcntl.lockf(fd, fcntl.LOCK_EX)
+    except OSError as e:
+        print("warning: %s cannot be locked (%s), package.yml is written unlocked" % (
+            path, e), file=sys.stderr)
+    return fd
+
+
+def yaml_load(content):
+    return yaml.load(content, Loader=YamlLoader)
+
+
+def yaml_dump(data, fp=None):
+    return yaml.dump(data, fp, Dumper=YamlDumper)
+
+
+def clear_package_cache():
+    _PACKAGE_CACHE.clear()
+
+
+def _read_cached_package(pkg_file: str):
+    key = os.path.abspath(pkg_file)
+    st = os.stat(key)
+    signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+    cached = _PACKAGE_CACHE.get(key)
+    content = None
+    if cached is not None and cached[0] == signature:
+        # a racy entry is only trusted if the content is the same
+        if cached[2] is None:
+            return cached[1]
+        with open(key, "r") as fp:
+            content = fp.read()
+        if content == cached[2]:
+            return cached[1]
+    racy = time.time() - st.st_mtime < RACY_DELAY
+    if racy:
+        if content is None:
+            with open(key, "r") as fp:
+                content = fp.read()
+        d = yaml_load(content)
+    else:
+        d = _load_manifest(key, st)
+    pkg = read_package(key, d)
+    _PACKAGE_CACHE[key] = (signature, pkg, content if racy else None)
+    return pkg
+
+
+def _manifest_sidecar(pkg_file: str):
+    if not vpm.config_flag("cache", "manifests"):
+        return None
+    digest = hashlib.sha1(pkg_file.encode("utf-8")).hexdigest()
+    return vpm.cache_dir("manifests", "%s.json" % digest)
+
+
+def _load_manifest(pkg_file: str, st):
+    # the json copy is used when newer than the yaml and of the same yaml
+    signature = [st.st_mtime_ns, st.st_size]
+    sidecar = _manifest_sidecar(pkg_file)
+    if sidecar and os.path.exists(sidecar) and os.stat(sidecar).st_mtime > st.st_mtime:
+        try:
+            with open(sidecar, "r") as fp:
+                data = json.load(fp)
+            if data.get("signature") == signature:
+                return data.get("content")
+        except (OSError, ValueError, AttributeError):
+            pass
+    with open(pkg_file, "r") as fp:
+        d = yaml_load(fp)
+    if sidecar:
+        tmp = vpm.cache_tmp_path(sidecar)
+        try:
+            os.makedirs(os.path.dirname(sidecar), exist_ok=True)
+            with open(tmp, "w") as fp:
+                json.dump({"signature": signature, "content": d}, fp)
+            os.replace(tmp, sidecar)
+        except (OSError, TypeError, ValueError):
+            # not json serializable or read-only cache
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    return d
 
 
 def get_package_path(path: str = None):
@@ -53,9 +216,8 @@ def get_package_path(path: str = None):
 
 
 def get_git_package(path: str = None):
-    match = vpm.is_git_path(path)
-    if match:
-        grps = [g for g in match.groups() if g]
+    grps = vpm.git_path_args(path)
+    if grps:
         for pkg in vpm.github_read_packages(*grps):
             return pkg
     return None